@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -77,7 +78,7 @@ WSGI_APPLICATION = 'bulk_upload_api.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('DJANGO_DB_PATH', BASE_DIR / 'db.sqlite3'),
     }
 }
 
@@ -125,7 +126,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_ROOT = os.getenv('DJANGO_MEDIA_ROOT', BASE_DIR / 'media')
 
 # REST Framework
 REST_FRAMEWORK = {
@@ -134,3 +135,70 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.MultiPartParser',
     ],
 }
+
+# Background removal (rembg / ONNX Runtime)
+# Thread counts of 0 let ONNX Runtime pick its own defaults. When several
+# workers share one CPU host, set INTRA_OP_NUM_THREADS so that
+# workers * threads does not exceed the number of physical cores.
+BACKGROUND_REMOVAL = {
+    'MODEL_NAME': os.getenv('REMBG_MODEL_NAME', 'u2net'),
+    # Local path to an int8-quantized (or any custom) U2Net-compatible ONNX
+    # model. When set, it is loaded instead of the downloaded fp32 model.
+    'MODEL_PATH': os.getenv('REMBG_MODEL_PATH', ''),
+    'INTRA_OP_NUM_THREADS': int(os.getenv('ORT_INTRA_OP_NUM_THREADS', '0')),
+    'INTER_OP_NUM_THREADS': int(os.getenv('ORT_INTER_OP_NUM_THREADS', '0')),
+    # One of: disable, basic, extended, all
+    'GRAPH_OPTIMIZATION_LEVEL': os.getenv('ORT_GRAPH_OPTIMIZATION_LEVEL', 'all'),
+    # One of: sequential, parallel
+    'EXECUTION_MODE': os.getenv('ORT_EXECUTION_MODE', 'sequential'),
+    'ENABLE_CPU_MEM_ARENA': os.getenv('ORT_ENABLE_CPU_MEM_ARENA', '1') == '1',
+    'ENABLE_MEM_PATTERN': os.getenv('ORT_ENABLE_MEM_PATTERN', '1') == '1',
+    'PROVIDERS': ['CPUExecutionProvider'],
+    # Replace the model with a cheap synthetic mask (load testing only).
+    # STUB_LATENCY adds a fixed delay per inference to mimic the real model.
+    'STUB_MODEL': os.getenv('REMBG_STUB_MODEL', '0') == '1',
+    'STUB_LATENCY': float(os.getenv('REMBG_STUB_LATENCY', '0')),
+}
+
+# Inference scheduler
+# All background-removal inference runs on WORKERS threads. Interactive
+# requests (single uploads, cartons) and bulk requests (product search) are
+# queued in separate lanes and share the workers by weight; a lane whose
+# oldest job has waited MAX_WAIT_SECONDS is served next regardless of weight.
+INFERENCE_SCHEDULER = {
+    'WORKERS': int(os.getenv('INFERENCE_WORKERS', '2')),
+    'LANE_WEIGHTS': {
+        'interactive': int(os.getenv('INFERENCE_INTERACTIVE_WEIGHT', '4')),
+        'bulk': int(os.getenv('INFERENCE_BULK_WEIGHT', '1')),
+    },
+    'MAX_WAIT_SECONDS': {
+        'interactive': float(os.getenv('INFERENCE_INTERACTIVE_MAX_WAIT', '2')),
+        'bulk': float(os.getenv('INFERENCE_BULK_MAX_WAIT', '30')),
+    },
+}
+
+# Media serving
+# Processed outputs are immutable, so they are served with strong ETags and a
+# long-lived Cache-Control. Set SENDFILE_BACKEND to hand the transfer to the
+# web server:
+#   'x-accel-redirect' - nginx; map ACCEL_REDIRECT_PREFIX to MEDIA_ROOT with an
+#                        `internal` location
+#   'x-sendfile'       - Apache mod_xsendfile / lighttpd
+#   ''                 - stream from Django with FileResponse (uses sendfile()
+#                        when the WSGI server provides wsgi.file_wrapper)
+MEDIA_SERVING = {
+    'SENDFILE_BACKEND': os.getenv('MEDIA_SENDFILE_BACKEND', ''),
+    'ACCEL_REDIRECT_PREFIX': os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/'),
+    'CACHE_MAX_AGE': int(os.getenv('MEDIA_CACHE_MAX_AGE', str(365 * 24 * 60 * 60))),
+}
+
+# Resized derivatives (e.g. /media/processed/<name>?w=256&fmt=webp)
+# Requested widths are rounded up to the nearest entry in WIDTHS. Generated
+# files live in MEDIA_ROOT/CACHE_DIR and the least recently used ones are
+# evicted once the cache grows past MAX_CACHE_BYTES.
+MEDIA_DERIVATIVES = {
+    'CACHE_DIR': 'derivatives',
+    'MAX_CACHE_BYTES': int(os.getenv('MEDIA_DERIVATIVE_CACHE_BYTES', str(512 * 1024 * 1024))),
+    'WIDTHS': (64, 128, 256, 512, 768),
+    'QUALITY': int(os.getenv('MEDIA_DERIVATIVE_QUALITY', '80')),
+}
@@ -3,6 +3,14 @@
 import { useState, useRef } from 'react';
 import { ProductCard, ProjectStatus } from '../types';
 
+// Processed outputs are 1080x1080 PNGs; cards only need a small preview, so
+// request a resized WebP derivative from the media server instead.
+const previewUrl = (url: string, width: number) => {
+  if (!url.includes('/media/processed/')) return url;
+  const separator = url.includes('?') ? '&' : '?';
+  return `${url}${separator}w=${width}&fmt=webp`;
+};
+
 interface ProductCardProps {
   card: ProductCard;
   projectStatus: ProjectStatus;
@@ -144,7 +152,7 @@ export default function ProductCardComponent({ card, projectStatus, onRefresh }:
         {mainImage ? (
           <div className="relative bg-gradient-to-br from-gray-50 to-gray-100 rounded-xl overflow-hidden mb-6" style={{ aspectRatio: '16/10' }}>
             <img
-              src={mainImage}
+              src={previewUrl(mainImage, 512)}
               alt={card.product_name}
               className="w-full h-full object-contain p-4"
               onError={(e) => {
@@ -214,7 +222,7 @@ export default function ProductCardComponent({ card, projectStatus, onRefresh }:
                     title={`Image from ${option.source}`}
                   >
                     <img
-                      src={option.thumbnail_url || option.original_url}
+                      src={previewUrl(option.thumbnail_url || option.original_url, 256)}
                       alt={`Option ${index + 1}`}
                       className="w-full h-full object-cover"
                       onError={(e) => {
@@ -1,3 +1,8 @@
 from django.contrib import admin
+from .models import ProcessedImageHash
 
-# Register your models here.
+
+@admin.register(ProcessedImageHash)
+class ProcessedImageHashAdmin(admin.ModelAdmin):
+    list_display = ('dhash', 'filename', 'source_url', 'created_at')
+    search_fields = ('dhash', 'filename', 'source_url')
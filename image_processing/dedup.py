@@ -0,0 +1,101 @@
+import io
+import os
+from django.conf import settings
+from django.db.models import Q
+from PIL import Image
+from .models import ProcessedImageHash
+
+
+HASH_SIZE = 8  # 8x8 comparisons -> 64-bit hash
+BAND_BITS = 16
+BAND_COUNT = 4
+# Maximum Hamming distance at which two images are treated as the same shot.
+# Must stay below BAND_COUNT for the banded index lookup to find every match.
+DUPLICATE_MAX_DISTANCE = 3
+
+
+def compute_dhash(image_data, hash_size=HASH_SIZE):
+    """
+    Compute the difference hash (dHash) of raw image bytes.
+    The image is reduced to a (hash_size + 1) x hash_size grayscale thumbnail
+    and each bit records whether a pixel is brighter than its right neighbour.
+    Returns the hash as an int.
+    """
+    image = Image.open(io.BytesIO(image_data))
+
+    # Let the JPEG decoder downscale while decoding instead of decoding full size
+    image.draft('L', (hash_size * 4, hash_size * 4))
+
+    thumbnail = image.convert('L').resize(
+        (hash_size + 1, hash_size), Image.Resampling.BILINEAR
+    )
+    pixels = list(thumbnail.getdata())
+
+    dhash = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            left = pixels[offset + col]
+            right = pixels[offset + col + 1]
+            dhash = (dhash << 1) | (1 if left > right else 0)
+
+    return dhash
+
+
+def hamming_distance(hash_a, hash_b):
+    """
+    Number of differing bits between two hashes.
+    """
+    return (hash_a ^ hash_b).bit_count()
+
+
+def is_near_duplicate(hash_a, hash_b, max_distance=DUPLICATE_MAX_DISTANCE):
+    return hamming_distance(hash_a, hash_b) <= max_distance
+
+
+def split_bands(dhash):
+    """
+    Split a 64-bit hash into BAND_COUNT integers of BAND_BITS each.
+    """
+    mask = (1 << BAND_BITS) - 1
+    return [(dhash >> (BAND_BITS * i)) & mask for i in range(BAND_COUNT)]
+
+
+def find_duplicate(dhash, max_distance=DUPLICATE_MAX_DISTANCE):
+    """
+    Look up a previously processed image that is a near-duplicate of `dhash`.
+    Entries whose processed file no longer exists are removed.
+    Returns the matching ProcessedImageHash or None.
+    """
+    bands = split_bands(dhash)
+    query = Q()
+    for i, band in enumerate(bands):
+        query |= Q(**{f'band{i}': band})
+
+    media_path = os.path.join(settings.MEDIA_ROOT, 'processed')
+
+    for entry in ProcessedImageHash.objects.filter(query).order_by('-created_at'):
+        if not is_near_duplicate(dhash, int(entry.dhash, 16), max_distance):
+            continue
+        if not os.path.exists(os.path.join(media_path, entry.filename)):
+            entry.delete()
+            continue
+        return entry
+
+    return None
+
+
+def record_image_hash(dhash, filename, source_url=''):
+    """
+    Store the hash of a processed search image in the persistent index.
+    """
+    bands = split_bands(dhash)
+    return ProcessedImageHash.objects.create(
+        dhash=f"{dhash:016x}",
+        band0=bands[0],
+        band1=bands[1],
+        band2=bands[2],
+        band3=bands[3],
+        filename=filename,
+        source_url=source_url[:2048],
+    )
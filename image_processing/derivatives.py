@@ -0,0 +1,189 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from django.conf import settings
+from PIL import Image
+
+
+# Output format -> (PIL format, file extension)
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'png': ('PNG', 'png'),
+    'jpeg': ('JPEG', 'jpg'),
+    'jpg': ('JPEG', 'jpg'),
+}
+
+# Seconds after which the running cache size is re-synced with a full scan,
+# to pick up derivatives written by other processes
+EVICTION_RESCAN_SECONDS = 300
+
+_eviction_lock = threading.Lock()
+_cache_lock = threading.Lock()
+# Running total of the cache size in bytes; None until the first scan
+_cache_state = {'size': None, 'scanned_at': 0.0}
+
+
+def get_derivative_config():
+    config = {
+        'CACHE_DIR': 'derivatives',
+        'MAX_CACHE_BYTES': 512 * 1024 * 1024,
+        'WIDTHS': (64, 128, 256, 512, 768),
+        'QUALITY': 80,
+    }
+    config.update(getattr(settings, 'MEDIA_DERIVATIVES', {}))
+    return config
+
+
+def get_cache_root(config=None):
+    config = config or get_derivative_config()
+    return os.path.join(settings.MEDIA_ROOT, config['CACHE_DIR'])
+
+
+def normalize_width(width, config=None):
+    """
+    Snap a requested width up to the nearest allowed width, so arbitrary
+    values cannot fill the cache with near-identical derivatives.
+    Returns None if the width is larger than every allowed width.
+    """
+    config = config or get_derivative_config()
+    for allowed in sorted(config['WIDTHS']):
+        if width <= allowed:
+            return allowed
+    return None
+
+
+def derivative_key(source_etag, width, fmt, quality):
+    """
+    Cache key for a derivative. The source is identified by its ETag (name,
+    size and mtime), so a changed source never reuses a stale derivative.
+    """
+    raw = f"{source_etag}|w={width}|fmt={fmt}|q={quality}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:40]
+
+
+def get_or_create_derivative(source_path, source_etag, width, fmt):
+    """
+    Return the relative media path of a resized derivative of `source_path`,
+    generating and caching it on first request. Cache hits refresh the file's
+    access time, which is used as the LRU timestamp for eviction.
+    A `width` of None keeps the source size and only converts the format.
+    """
+    config = get_derivative_config()
+    pil_format, extension = DERIVATIVE_FORMATS[fmt]
+
+    key = derivative_key(source_etag, width, fmt, config['QUALITY'])
+    relative_path = f"{config['CACHE_DIR']}/{key[:2]}/{key}.{extension}"
+    cache_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+
+    if os.path.exists(cache_path):
+        try:
+            # Only the access time is bumped; mtime is part of the ETag
+            stat_result = os.stat(cache_path)
+            os.utime(cache_path, ns=(time.time_ns(), stat_result.st_mtime_ns))
+        except OSError:
+            pass
+        return relative_path
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+    with Image.open(source_path) as source:
+        # Never upscale; a small source keeps its own width
+        if width is not None and source.width > width:
+            height = max(1, round(source.height * width / source.width))
+            # draft() lets the JPEG decoder downscale while decoding
+            source.draft('RGB', (width, height))
+            image = source.resize((width, height), Image.Resampling.LANCZOS)
+        else:
+            image = source.copy()
+
+    save_kwargs = {}
+    if pil_format == 'JPEG':
+        image = image.convert('RGB')
+        save_kwargs = {'quality': config['QUALITY'], 'optimize': True}
+    elif pil_format == 'WEBP':
+        save_kwargs = {'quality': config['QUALITY'], 'method': 4}
+
+    # Write to a temporary file and rename, so concurrent requests never see
+    # a partially written derivative
+    temp_path = f"{cache_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        image.save(temp_path, format=pil_format, **save_kwargs)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, cache_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    record_derivative_write(size, config, keep=cache_path)
+
+    return relative_path
+
+
+def record_derivative_write(size, config=None, keep=None):
+    """
+    Add a newly written derivative to the running cache size, and evict only
+    when the total goes over MAX_CACHE_BYTES (or has not been synced by a full
+    scan for EVICTION_RESCAN_SECONDS).
+    """
+    config = config or get_derivative_config()
+
+    with _cache_lock:
+        if _cache_state['size'] is not None:
+            _cache_state['size'] += size
+        needs_scan = (
+            _cache_state['size'] is None
+            or _cache_state['size'] > config['MAX_CACHE_BYTES']
+            or time.monotonic() - _cache_state['scanned_at'] > EVICTION_RESCAN_SECONDS
+        )
+
+    if needs_scan:
+        evict_derivatives(config, keep=keep)
+
+
+def evict_derivatives(config=None, keep=None):
+    """
+    Scan the cache, remove least recently used derivatives until it fits in
+    MAX_CACHE_BYTES and re-sync the running cache size.
+    `keep` is never removed, so a derivative that was just generated can be served.
+    """
+    config = config or get_derivative_config()
+    cache_root = get_cache_root(config)
+
+    if not _eviction_lock.acquire(blocking=False):
+        # Another thread is already evicting
+        return
+
+    try:
+        entries = []
+        total_size = 0
+        for directory, _, filenames in os.walk(cache_root):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, filename)
+                try:
+                    stat_result = os.stat(path)
+                except OSError:
+                    continue
+                total_size += stat_result.st_size
+                if path != keep:
+                    entries.append((stat_result.st_atime, stat_result.st_size, path))
+
+        # Oldest access first
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= config['MAX_CACHE_BYTES']:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                continue
+
+        with _cache_lock:
+            _cache_state['size'] = total_size
+            _cache_state['scanned_at'] = time.monotonic()
+    finally:
+        _eviction_lock.release()
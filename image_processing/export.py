@@ -0,0 +1,76 @@
+import os
+import zipfile
+
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Formats that are already compressed; deflating them again only costs CPU
+STORED_EXTENSIONS = ('.png', '.webp', '.jpg', '.jpeg')
+
+
+class ZipStreamBuffer:
+    """
+    Write-only, non-seekable file object for zipfile. Written bytes are held
+    only until the streaming generator collects them with pop().
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip_stream(file_paths, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Build a ZIP archive of `file_paths` on the fly and yield it in chunks.
+    Each file is read in `chunk_size` pieces, so memory use does not depend on
+    the size of the files or of the archive. Already-compressed images are
+    stored uncompressed.
+    """
+    buffer = ZipStreamBuffer()
+
+    with zipfile.ZipFile(buffer, mode='w', allowZip64=True) as archive:
+        for path in file_paths:
+            name = os.path.basename(path)
+            file_size = os.path.getsize(path)
+
+            zip_info = zipfile.ZipInfo.from_file(path, arcname=name)
+            if name.lower().endswith(STORED_EXTENSIONS):
+                zip_info.compress_type = zipfile.ZIP_STORED
+            else:
+                zip_info.compress_type = zipfile.ZIP_DEFLATED
+
+            with open(path, 'rb') as source, archive.open(
+                zip_info, mode='w', force_zip64=file_size > zipfile.ZIP64_LIMIT
+            ) as target:
+                while True:
+                    chunk = source.read(chunk_size)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = buffer.pop()
+                    if data:
+                        yield data
+
+            data = buffer.pop()
+            if data:
+                yield data
+
+    # Central directory is written when the archive is closed
+    data = buffer.pop()
+    if data:
+        yield data
@@ -0,0 +1,142 @@
+import threading
+import time
+import onnxruntime as ort
+from django.conf import settings
+from PIL import Image, ImageDraw
+from rembg.sessions import sessions
+
+
+GRAPH_OPTIMIZATION_LEVELS = {
+    'disable': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+EXECUTION_MODES = {
+    'sequential': ort.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': ort.ExecutionMode.ORT_PARALLEL,
+}
+
+# Model used when a custom/quantized model path is configured. It shares
+# U2Net's pre- and post-processing, so any U2Net-compatible export works.
+CUSTOM_MODEL_NAME = 'u2net_custom'
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_inference_config(**overrides):
+    """
+    Return the BACKGROUND_REMOVAL settings merged over the defaults.
+    Keyword overrides take precedence over the Django settings.
+    """
+    config = {
+        'MODEL_NAME': 'u2net',
+        'MODEL_PATH': '',
+        'INTRA_OP_NUM_THREADS': 0,
+        'INTER_OP_NUM_THREADS': 0,
+        'GRAPH_OPTIMIZATION_LEVEL': 'all',
+        'EXECUTION_MODE': 'sequential',
+        'ENABLE_CPU_MEM_ARENA': True,
+        'ENABLE_MEM_PATTERN': True,
+        'PROVIDERS': ['CPUExecutionProvider'],
+        'STUB_MODEL': False,
+        'STUB_LATENCY': 0.0,
+    }
+    config.update(getattr(settings, 'BACKGROUND_REMOVAL', {}))
+    config.update(overrides)
+    return config
+
+
+def build_session_options(config):
+    """
+    Build ONNX Runtime SessionOptions from an inference config dict.
+    """
+    level = str(config['GRAPH_OPTIMIZATION_LEVEL']).lower()
+    mode = str(config['EXECUTION_MODE']).lower()
+
+    if level not in GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(
+            f"Invalid GRAPH_OPTIMIZATION_LEVEL '{level}'. "
+            f"Allowed values: {', '.join(GRAPH_OPTIMIZATION_LEVELS)}"
+        )
+    if mode not in EXECUTION_MODES:
+        raise ValueError(
+            f"Invalid EXECUTION_MODE '{mode}'. "
+            f"Allowed values: {', '.join(EXECUTION_MODES)}"
+        )
+
+    sess_opts = ort.SessionOptions()
+    sess_opts.intra_op_num_threads = int(config['INTRA_OP_NUM_THREADS'])
+    sess_opts.inter_op_num_threads = int(config['INTER_OP_NUM_THREADS'])
+    sess_opts.graph_optimization_level = GRAPH_OPTIMIZATION_LEVELS[level]
+    sess_opts.execution_mode = EXECUTION_MODES[mode]
+    sess_opts.enable_cpu_mem_arena = bool(config['ENABLE_CPU_MEM_ARENA'])
+    sess_opts.enable_mem_pattern = bool(config['ENABLE_MEM_PATTERN'])
+
+    return sess_opts
+
+
+class StubSession:
+    """
+    Stand-in for a rembg session that returns a centered elliptical mask
+    without running a model. Used for load tests that should not be bound by
+    inference cost.
+    """
+
+    def __init__(self, latency=0.0):
+        self.model_name = 'stub'
+        self.latency = latency
+
+    def predict(self, img, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+        width, height = img.size
+        mask = Image.new('L', img.size, 0)
+        ImageDraw.Draw(mask).ellipse(
+            (width // 8, height // 8, width * 7 // 8, height * 7 // 8),
+            fill=255,
+        )
+        return [mask]
+
+
+def create_session(**overrides):
+    """
+    Create a new rembg session using the configured ONNX Runtime options.
+    If MODEL_PATH is set, the model is loaded from that local path (e.g. an
+    int8-quantized export) instead of the downloaded fp32 model.
+    """
+    config = get_inference_config(**overrides)
+    if config['STUB_MODEL']:
+        return StubSession(latency=float(config['STUB_LATENCY']))
+
+    sess_opts = build_session_options(config)
+
+    kwargs = {'providers': list(config['PROVIDERS'])}
+    if config['MODEL_PATH']:
+        model_name = CUSTOM_MODEL_NAME
+        kwargs['model_path'] = str(config['MODEL_PATH'])
+    else:
+        model_name = config['MODEL_NAME']
+
+    if model_name not in sessions:
+        raise ValueError(f"Unknown rembg model '{model_name}'")
+
+    return sessions[model_name](model_name, sess_opts, **kwargs)
+
+
+def get_session():
+    """
+    Return the process-wide rembg session, creating it on first use.
+    ONNX Runtime sessions are safe to share between threads for inference.
+    """
+    global _session
+
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+
+    return _session
@@ -0,0 +1,251 @@
+import hashlib
+import io
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import requests
+from PIL import Image, ImageDraw
+
+
+class FakeServiceConfig:
+    """
+    Latency and failure behaviour of a fake upstream service.
+    Each response is delayed by `latency` seconds +/- `jitter` and fails with
+    HTTP 500 with probability `error_rate`.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def delay(self):
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+class FakeServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        # Keep load test output readable
+        pass
+
+    def handle(self):
+        # Clients close connections early on purpose (e.g. candidate
+        # pre-screening reads only the first few KB of an image)
+        try:
+            super().handle()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+
+    def send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        config = self.server.service_config
+        config.delay()
+
+        if config.should_fail():
+            self.send_body(500, 'application/json', b'{"error": "injected failure"}')
+            return
+
+        self.server.respond(self)
+
+
+def custom_search_response(handler):
+    """
+    Answer a Custom Search `cse.list` request with links to the fake image host.
+    The same query always returns the same links.
+    """
+    query = parse_qs(urlparse(handler.path).query)
+    q = query.get('q', [''])[0]
+    num = int(query.get('num', ['10'])[0])
+
+    token = hashlib.sha1(q.encode('utf-8')).hexdigest()[:12]
+    image_host = handler.server.image_host_url
+    items = [
+        {
+            'title': f"{q} {i + 1}",
+            'link': f"{image_host}/images/{token}/{i}.jpg",
+            'mime': 'image/jpeg',
+        }
+        for i in range(num)
+    ]
+
+    body = json.dumps({'kind': 'customsearch#search', 'items': items}).encode('utf-8')
+    handler.send_body(200, 'application/json', body)
+
+
+def image_host_response(handler):
+    """
+    Serve a JPEG from a pre-generated pool. Each URL maps to a fixed image.
+    """
+    pool = handler.server.image_pool
+    index = int(hashlib.sha1(handler.path.encode('utf-8')).hexdigest(), 16) % len(pool)
+    handler.send_body(200, 'image/jpeg', pool[index])
+
+
+class FakeServer:
+    """
+    Runs a fake service on a ThreadingHTTPServer in a background thread.
+    `respond(handler)` writes the response to each GET that is not an
+    injected failure; extra attributes are set on the server for it to read.
+    """
+
+    def __init__(self, respond, service_config, host='127.0.0.1', port=0, **attributes):
+        self.httpd = ThreadingHTTPServer((host, port), FakeServiceHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.service_config = service_config
+        self.httpd.respond = respond
+        for name, value in attributes.items():
+            setattr(self.httpd, name, value)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def generate_product_image(seed, size=1000):
+    """
+    Generate a JPEG of a simple "product" on a light background. Different
+    seeds give visually different images, so they are not perceptual duplicates.
+    """
+    rng = random.Random(seed)
+    background = tuple(rng.randint(215, 255) for _ in range(3))
+    image = Image.new('RGB', (size, size), background)
+    draw = ImageDraw.Draw(image)
+
+    for _ in range(rng.randint(2, 5)):
+        x0 = rng.randint(0, size * 2 // 3)
+        y0 = rng.randint(0, size * 2 // 3)
+        x1 = x0 + rng.randint(size // 6, size // 3)
+        y1 = y0 + rng.randint(size // 6, size // 3)
+        color = tuple(rng.randint(0, 180) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+        else:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def generate_image_pool(pool_size, image_size=1000):
+    return [generate_product_image(seed, image_size) for seed in range(pool_size)]
+
+
+def start_fake_image_host(image_pool, service_config, host='127.0.0.1', port=0):
+    return FakeServer(
+        image_host_response, service_config, host, port, image_pool=image_pool
+    ).start()
+
+
+def start_fake_custom_search(image_host_url, service_config, host='127.0.0.1', port=0):
+    return FakeServer(
+        custom_search_response, service_config, host, port, image_host_url=image_host_url
+    ).start()
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # Multiply first so exact ranks are not pushed up by float error
+    rank = math.ceil(pct * len(ordered) / 100)
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def summarize(results, elapsed):
+    """
+    Summarize request results as latency percentiles (ms), throughput and
+    status counts. Each result is a (endpoint, status, latency_seconds) tuple.
+    """
+    latencies = [latency for _, _, latency in results]
+    statuses = {}
+    for _, status_code, _ in results:
+        statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+    errors = sum(
+        1 for _, status_code, _ in results
+        if not isinstance(status_code, int) or status_code >= 400
+    )
+
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'statuses': statuses,
+        'throughput_rps': round(len(results) / elapsed, 3) if elapsed else 0.0,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+            'p50': round(percentile(latencies, 50) * 1000, 1),
+            'p95': round(percentile(latencies, 95) * 1000, 1),
+            'p99': round(percentile(latencies, 99) * 1000, 1),
+            'max': round(max(latencies) * 1000, 1) if latencies else 0.0,
+        },
+    }
+
+
+def run_load(send_request, plan, concurrency):
+    """
+    Execute `plan` (a list of endpoint names) with `concurrency` worker threads.
+    `send_request(session, endpoint, sequence)` performs one request and
+    returns its HTTP status code. Returns (results, elapsed_seconds).
+    """
+    results = []
+    results_lock = threading.Lock()
+    position = {'next': 0}
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with results_lock:
+                sequence = position['next']
+                if sequence >= len(plan):
+                    return
+                position['next'] += 1
+
+            endpoint = plan[sequence]
+            start = time.perf_counter()
+            try:
+                status_code = send_request(session, endpoint, sequence)
+            except requests.RequestException as e:
+                status_code = type(e).__name__
+            latency = time.perf_counter() - start
+
+            with results_lock:
+                results.append((endpoint, status_code, latency))
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return results, time.perf_counter() - start
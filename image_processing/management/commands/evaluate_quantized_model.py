@@ -0,0 +1,152 @@
+import os
+import time
+import numpy as np
+from PIL import Image
+from django.core.management.base import BaseCommand, CommandError
+from image_processing.inference import create_session, get_inference_config
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+DEFAULT_FIXTURES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'testdata',
+    'matting',
+)
+
+
+def predict_mask(session, image):
+    """
+    Run a rembg session on a PIL image and return the alpha mask as floats in [0, 1]
+    together with the inference time in seconds.
+    """
+    start = time.perf_counter()
+    masks = session.predict(image)
+    elapsed = time.perf_counter() - start
+    return np.asarray(masks[0], dtype=np.float32) / 255.0, elapsed
+
+
+def compare_masks(reference, candidate, threshold=0.5):
+    """
+    Compare two alpha masks. Returns mean/max absolute error and the IoU of
+    the binarized foregrounds.
+    """
+    diff = np.abs(reference - candidate)
+
+    ref_fg = reference >= threshold
+    cand_fg = candidate >= threshold
+    union = np.logical_or(ref_fg, cand_fg).sum()
+    intersection = np.logical_and(ref_fg, cand_fg).sum()
+    iou = float(intersection / union) if union else 1.0
+
+    return {
+        'mean_abs_error': float(diff.mean()),
+        'max_abs_error': float(diff.max()),
+        'iou': iou,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the accuracy delta between the fp32 matting model and a "
+        "quantized model on a directory of fixture images."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fixtures',
+            nargs='?',
+            default=DEFAULT_FIXTURES_DIR,
+            help='Directory containing fixture images (default: image_processing/testdata/matting)',
+        )
+        parser.add_argument(
+            '--model-path',
+            help='Path to the quantized ONNX model (defaults to BACKGROUND_REMOVAL["MODEL_PATH"])',
+        )
+        parser.add_argument(
+            '--reference-model',
+            default='u2net',
+            help='rembg model name used as the fp32 reference (default: u2net)',
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.5,
+            help='Alpha threshold used to binarize masks for IoU (default: 0.5)',
+        )
+        parser.add_argument(
+            '--max-mean-error',
+            type=float,
+            help='Exit with an error if the average mean absolute error exceeds this value',
+        )
+
+    def handle(self, *args, **options):
+        fixtures_dir = options['fixtures']
+        if not os.path.isdir(fixtures_dir):
+            raise CommandError(f"Fixture directory not found: {fixtures_dir}")
+
+        model_path = options['model_path'] or get_inference_config()['MODEL_PATH']
+        if not model_path:
+            raise CommandError(
+                "No quantized model configured. Pass --model-path or set REMBG_MODEL_PATH."
+            )
+        if not os.path.isfile(model_path):
+            raise CommandError(f"Quantized model not found: {model_path}")
+
+        fixtures = sorted(
+            os.path.join(fixtures_dir, name)
+            for name in os.listdir(fixtures_dir)
+            if name.lower().endswith(IMAGE_EXTENSIONS)
+        )
+        if not fixtures:
+            raise CommandError(f"No images found in {fixtures_dir}")
+
+        reference_session = create_session(
+            MODEL_NAME=options['reference_model'], MODEL_PATH=''
+        )
+        quantized_session = create_session(MODEL_PATH=model_path)
+
+        results = []
+        reference_time = 0.0
+        quantized_time = 0.0
+
+        for path in fixtures:
+            image = Image.open(path).convert('RGB')
+
+            reference_mask, ref_elapsed = predict_mask(reference_session, image)
+            quantized_mask, quant_elapsed = predict_mask(quantized_session, image)
+            reference_time += ref_elapsed
+            quantized_time += quant_elapsed
+
+            metrics = compare_masks(reference_mask, quantized_mask, options['threshold'])
+            results.append(metrics)
+
+            self.stdout.write(
+                f"{os.path.basename(path)}: "
+                f"mean_abs_error={metrics['mean_abs_error']:.4f} "
+                f"max_abs_error={metrics['max_abs_error']:.4f} "
+                f"iou={metrics['iou']:.4f} "
+                f"fp32={ref_elapsed * 1000:.1f}ms quantized={quant_elapsed * 1000:.1f}ms"
+            )
+
+        count = len(results)
+        mean_error = sum(r['mean_abs_error'] for r in results) / count
+        mean_iou = sum(r['iou'] for r in results) / count
+        worst_iou = min(r['iou'] for r in results)
+
+        self.stdout.write('')
+        self.stdout.write(f"Images evaluated: {count}")
+        self.stdout.write(f"Average mean absolute alpha error: {mean_error:.4f}")
+        self.stdout.write(f"Average IoU: {mean_iou:.4f} (worst: {worst_iou:.4f})")
+        self.stdout.write(
+            f"Average inference time: fp32={reference_time / count * 1000:.1f}ms "
+            f"quantized={quantized_time / count * 1000:.1f}ms"
+        )
+
+        if options['max_mean_error'] is not None and mean_error > options['max_mean_error']:
+            raise CommandError(
+                f"Average mean absolute error {mean_error:.4f} exceeds "
+                f"{options['max_mean_error']:.4f}"
+            )
+
+        self.stdout.write(self.style.SUCCESS('Evaluation complete'))
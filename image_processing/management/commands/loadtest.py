@@ -0,0 +1,290 @@
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from image_processing.loadtest import (
+    FakeServiceConfig,
+    generate_image_pool,
+    run_load,
+    start_fake_custom_search,
+    start_fake_image_host,
+    summarize,
+)
+
+
+ENDPOINTS = {
+    'search': 'api/search-product-images/',
+    'remove': 'api/remove-background/',
+    'carton': 'api/create-carton/',
+}
+
+
+def parse_mix(value):
+    """
+    Parse an endpoint mix such as "search:3,remove:1" into {endpoint: weight}.
+    """
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.strip().partition(':')
+        if name not in ENDPOINTS:
+            raise CommandError(
+                f"Unknown endpoint '{name}' in --mix. Allowed: {', '.join(ENDPOINTS)}"
+            )
+        try:
+            mix[name] = int(weight) if weight else 1
+        except ValueError:
+            raise CommandError(f"Invalid weight '{weight}' in --mix")
+    if not any(mix.values()):
+        raise CommandError("--mix must contain at least one positive weight")
+    return mix
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the API offline. Starts local stand-ins for Google Custom "
+        "Search and remote image hosts, drives the API at a fixed concurrency "
+        "and reports p50/p95/p99 latency and throughput."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            help='Base URL of an already running API. If omitted, a server is '
+                 'started on a temporary database and media directory.',
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=100, help='Measured requests')
+        parser.add_argument('--warmup', type=int, default=0, help='Unmeasured requests sent first')
+        parser.add_argument(
+            '--mix',
+            default='search:1',
+            help='Weighted endpoint mix, e.g. "search:3,remove:1" (endpoints: %s)' % ', '.join(ENDPOINTS),
+        )
+        parser.add_argument('--num-images', type=int, default=3, help='num_images sent to search')
+        parser.add_argument(
+            '--products',
+            type=int,
+            default=50,
+            help='Number of distinct product names to cycle through (fewer means more repeats)',
+        )
+        parser.add_argument('--search-latency', type=float, default=0.2)
+        parser.add_argument('--search-jitter', type=float, default=0.05)
+        parser.add_argument('--search-error-rate', type=float, default=0.0)
+        parser.add_argument('--search-port', type=int, default=0)
+        parser.add_argument('--image-latency', type=float, default=0.1)
+        parser.add_argument('--image-jitter', type=float, default=0.05)
+        parser.add_argument('--image-error-rate', type=float, default=0.0)
+        parser.add_argument('--image-port', type=int, default=0)
+        parser.add_argument('--image-pool', type=int, default=200, help='Distinct images served by the fake host')
+        parser.add_argument('--image-size', type=int, default=1000, help='Edge length of fake images in pixels')
+        parser.add_argument(
+            '--stub-model',
+            action='store_true',
+            help='Replace rembg inference with a synthetic mask in the spawned server',
+        )
+        parser.add_argument('--stub-latency', type=float, default=0.0, help='Seconds per stubbed inference')
+        parser.add_argument('--server-env', action='append', default=[], help='Extra KEY=VALUE for the spawned server')
+        parser.add_argument('--timeout', type=float, default=120.0, help='Per-request timeout in seconds')
+        parser.add_argument('--json', dest='json_path', help='Also write the report to this JSON file')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1 or options['requests'] < 1:
+            raise CommandError("--concurrency and --requests must be at least 1")
+
+        mix = parse_mix(options['mix'])
+
+        self.stdout.write(f"Generating {options['image_pool']} fake images...")
+        image_pool = generate_image_pool(options['image_pool'], options['image_size'])
+
+        image_host = start_fake_image_host(
+            image_pool,
+            FakeServiceConfig(options['image_latency'], options['image_jitter'], options['image_error_rate']),
+            port=options['image_port'],
+        )
+        search_service = start_fake_custom_search(
+            image_host.url,
+            FakeServiceConfig(options['search_latency'], options['search_jitter'], options['search_error_rate']),
+            port=options['search_port'],
+        )
+        self.stdout.write(f"Fake image host: {image_host.url}")
+        self.stdout.write(f"Fake Custom Search: {search_service.url}/")
+
+        server = None
+        workdir = None
+        try:
+            if options['target']:
+                target = options['target'].rstrip('/') + '/'
+                self.stdout.write(
+                    "Using external target. Start it with:\n"
+                    f"  GOOGLE_CSE_ENDPOINT={search_service.url}/ API_KEY=loadtest GOOGLE_CSE_ID=loadtest"
+                )
+            else:
+                workdir = tempfile.TemporaryDirectory(prefix='bulk-upload-loadtest-')
+                server, target = self.start_server(search_service.url, workdir.name, options)
+
+            report = self.run(target, mix, image_pool, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                try:
+                    server.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            if workdir is not None:
+                workdir.cleanup()
+            search_service.stop()
+            image_host.stop()
+
+        self.print_report(report)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['json_path']}")
+
+    def start_server(self, search_url, workdir, options):
+        port = free_port()
+        env = os.environ.copy()
+        env.update({
+            'API_KEY': 'loadtest',
+            'GOOGLE_CSE_ID': 'loadtest',
+            'GOOGLE_CSE_ENDPOINT': f"{search_url}/",
+            'DJANGO_DB_PATH': os.path.join(workdir, 'db.sqlite3'),
+            'DJANGO_MEDIA_ROOT': os.path.join(workdir, 'media'),
+        })
+        if options['stub_model']:
+            env['REMBG_STUB_MODEL'] = '1'
+            env['REMBG_STUB_LATENCY'] = str(options['stub_latency'])
+        for item in options['server_env']:
+            key, sep, value = item.partition('=')
+            if not sep:
+                raise CommandError(f"Invalid --server-env '{item}', expected KEY=VALUE")
+            env[key] = value
+
+        manage_py = os.path.join(settings.BASE_DIR, 'manage.py')
+        subprocess.run(
+            [sys.executable, manage_py, 'migrate', '--noinput'],
+            env=env, check=True, stdout=subprocess.DEVNULL,
+        )
+        server = subprocess.Popen(
+            [sys.executable, manage_py, 'runserver', f"127.0.0.1:{port}", '--noreload'],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+        target = f"http://127.0.0.1:{port}/"
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("API server exited during startup")
+            try:
+                requests.get(target + 'api/scheduler-stats/', timeout=1)
+                break
+            except requests.RequestException:
+                time.sleep(0.2)
+        else:
+            server.terminate()
+            raise CommandError("API server did not start within 30 seconds")
+
+        self.stdout.write(f"API server: {target}")
+        return server, target
+
+    def run(self, target, mix, image_pool, options):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        rng = random.Random(0)
+
+        def make_plan(count):
+            return rng.choices(names, weights=weights, k=count)
+
+        def send_request(session, endpoint, sequence):
+            url = target + ENDPOINTS[endpoint]
+            if endpoint == 'search':
+                response = session.post(url, json={
+                    'product_name': f"loadtest product {sequence % options['products']}",
+                    'num_images': options['num_images'],
+                }, timeout=options['timeout'])
+            else:
+                image = image_pool[sequence % len(image_pool)]
+                data = {'quantity': 6} if endpoint == 'carton' else {}
+                response = session.post(
+                    url,
+                    data=data,
+                    files={'image': ('loadtest.jpg', image, 'image/jpeg')},
+                    timeout=options['timeout'],
+                )
+            return response.status_code
+
+        if options['warmup']:
+            self.stdout.write(f"Warming up with {options['warmup']} requests...")
+            run_load(send_request, make_plan(options['warmup']), options['concurrency'])
+
+        self.stdout.write(
+            f"Sending {options['requests']} requests at concurrency {options['concurrency']}..."
+        )
+        results, elapsed = run_load(send_request, make_plan(options['requests']), options['concurrency'])
+
+        report = {
+            'config': {
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'mix': mix,
+                'num_images': options['num_images'],
+                'products': options['products'],
+                'search_latency': options['search_latency'],
+                'search_error_rate': options['search_error_rate'],
+                'image_latency': options['image_latency'],
+                'image_error_rate': options['image_error_rate'],
+                'stub_model': options['stub_model'],
+                'stub_latency': options['stub_latency'],
+            },
+            'elapsed_seconds': round(elapsed, 3),
+            'overall': summarize(results, elapsed),
+            'endpoints': {
+                name: summarize([r for r in results if r[0] == name], elapsed)
+                for name in names
+            },
+        }
+
+        try:
+            stats = requests.get(target + 'api/scheduler-stats/', timeout=5).json()
+            report['scheduler'] = stats.get('scheduler')
+        except (requests.RequestException, ValueError):
+            pass
+
+        return report
+
+    def print_report(self, report):
+        self.stdout.write('')
+        self.stdout.write(f"Elapsed: {report['elapsed_seconds']:.2f}s")
+        for name, summary in [('overall', report['overall'])] + list(report['endpoints'].items()):
+            latency = summary['latency_ms']
+            self.stdout.write(
+                f"{name:>8}: {summary['requests']} requests, {summary['errors']} errors, "
+                f"{summary['throughput_rps']:.2f} req/s | "
+                f"p50={latency['p50']:.1f}ms p95={latency['p95']:.1f}ms "
+                f"p99={latency['p99']:.1f}ms max={latency['max']:.1f}ms"
+            )
+            self.stdout.write(f"          statuses: {summary['statuses']}")
+
+        if report.get('scheduler'):
+            for name, lane in report['scheduler']['lanes'].items():
+                self.stdout.write(
+                    f"  lane {name}: completed={lane['completed']} "
+                    f"avg_wait={lane['avg_wait'] * 1000:.1f}ms "
+                    f"max_wait={lane['max_observed_wait'] * 1000:.1f}ms"
+                )
+
+        self.stdout.write(self.style.SUCCESS('Load test complete'))
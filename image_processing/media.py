@@ -0,0 +1,173 @@
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+SENDFILE_NONE = ''
+SENDFILE_X_ACCEL_REDIRECT = 'x-accel-redirect'
+SENDFILE_X_SENDFILE = 'x-sendfile'
+SENDFILE_BACKENDS = (SENDFILE_NONE, SENDFILE_X_ACCEL_REDIRECT, SENDFILE_X_SENDFILE)
+
+RANGE_CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Only these responses get the ETag and long-lived Cache-Control headers;
+# 412 and 416 errors must not be cached as the file's representation
+CACHEABLE_STATUSES = (200, 206, 304)
+
+
+def get_media_serving_config():
+    config = {
+        'SENDFILE_BACKEND': SENDFILE_NONE,
+        'ACCEL_REDIRECT_PREFIX': '/protected-media/',
+        'CACHE_MAX_AGE': 365 * 24 * 60 * 60,
+    }
+    config.update(getattr(settings, 'MEDIA_SERVING', {}))
+
+    if config['SENDFILE_BACKEND'] not in SENDFILE_BACKENDS:
+        raise ValueError(
+            f"Invalid SENDFILE_BACKEND '{config['SENDFILE_BACKEND']}'. "
+            f"Allowed values: {', '.join(repr(b) for b in SENDFILE_BACKENDS)}"
+        )
+
+    return config
+
+
+def file_etag(path, stat_result):
+    """
+    Strong ETag for an immutable media file, built from its name, size and
+    modification time. Outputs are written once under unique names, so this
+    identifies the contents without reading the file.
+    """
+    name_hash = hashlib.sha1(os.path.basename(path).encode('utf-8')).hexdigest()[:8]
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}-{name_hash}"'
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range `Range` header against a file of `size` bytes.
+    Returns (start, end) inclusive, None if the header should be ignored
+    (missing, malformed or multi-range), or False if it is unsatisfiable.
+    """
+    if not header:
+        return None
+
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+
+    start, end = match.groups()
+    if not start and not end:
+        return None
+
+    if not start:
+        # Suffix range: last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return False
+
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path, start, end, chunk_size=RANGE_CHUNK_SIZE):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, relative_path):
+    """
+    Serve an immutable media file with a strong ETag and long-lived caching.
+    Handles If-None-Match/If-Modified-Since and single byte ranges. The
+    transfer itself is offloaded to the web server via X-Accel-Redirect or
+    X-Sendfile when configured, and otherwise uses FileResponse so WSGI
+    servers with wsgi.file_wrapper can send the file with sendfile().
+    """
+    config = get_media_serving_config()
+    stat_result = os.stat(path)
+    etag = file_etag(path, stat_result)
+    last_modified = int(stat_result.st_mtime)
+
+    cache_headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Cache-Control': f"public, max-age={config['CACHE_MAX_AGE']}, immutable",
+    }
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        return _with_cache_headers(conditional, cache_headers)
+
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+
+    if config['SENDFILE_BACKEND'] == SENDFILE_X_ACCEL_REDIRECT:
+        # nginx serves the body (including ranges) from an internal location
+        response = HttpResponse(content_type=content_type)
+        # Header values must be ASCII; nginx percent-decodes the redirect URI
+        response['X-Accel-Redirect'] = quote(config['ACCEL_REDIRECT_PREFIX'] + relative_path)
+    elif config['SENDFILE_BACKEND'] == SENDFILE_X_SENDFILE:
+        # Apache mod_xsendfile / lighttpd serve the body from the absolute path,
+        # percent-decoding it first (XSendFileUnescape is on by default)
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = quote(str(path))
+    else:
+        response = _file_or_range_response(request, path, stat_result.st_size, etag, content_type)
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+
+    return _with_cache_headers(response, cache_headers)
+
+
+def _with_cache_headers(response, cache_headers):
+    if response.status_code in CACHEABLE_STATUSES:
+        for header, value in cache_headers.items():
+            response[header] = value
+    return response
+
+
+def _file_or_range_response(request, path, size, etag, content_type):
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+
+    # If-Range with a different ETag means the client's partial copy is stale
+    if not if_range or if_range == etag:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_file_range(path, start, end),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+
+    response['Accept-Ranges'] = 'bytes'
+    return response
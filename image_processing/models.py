@@ -1,3 +1,24 @@
 from django.db import models
 
-# Create your models here.
+
+class ProcessedImageHash(models.Model):
+    """
+    Perceptual hash (dHash) of a downloaded search image and the processed
+    output it produced. Used to recognize near-duplicate search results across
+    requests without running inference again.
+
+    The 64-bit hash is also split into four 16-bit bands. Two hashes within a
+    Hamming distance of 3 always share at least one band exactly, so candidate
+    matches can be found with indexed equality lookups.
+    """
+    dhash = models.CharField(max_length=16)
+    band0 = models.PositiveIntegerField(db_index=True)
+    band1 = models.PositiveIntegerField(db_index=True)
+    band2 = models.PositiveIntegerField(db_index=True)
+    band3 = models.PositiveIntegerField(db_index=True)
+    filename = models.CharField(max_length=255)
+    source_url = models.URLField(max_length=2048, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.dhash} -> {self.filename}"
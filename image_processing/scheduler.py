@@ -0,0 +1,199 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from django.conf import settings
+
+
+LANE_INTERACTIVE = 'interactive'
+LANE_BULK = 'bulk'
+LANES = (LANE_INTERACTIVE, LANE_BULK)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+class Lane:
+    """
+    FIFO queue of pending jobs for one priority lane, plus its wait-time stats.
+    """
+
+    def __init__(self, name, weight, max_wait):
+        self.name = name
+        self.weight = weight
+        self.max_wait = max_wait
+        self.queue = deque()
+        self.current_weight = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+        self.last_served = time.monotonic()
+
+    def oldest_wait(self, now):
+        if not self.queue:
+            return 0.0
+        return now - self.queue[0][0]
+
+    def is_starving(self, now):
+        """
+        True if the oldest job has waited past max_wait and the lane has not
+        been served within the last max_wait seconds either.
+        """
+        if self.max_wait is None or not self.queue:
+            return False
+        return (
+            self.oldest_wait(now) >= self.max_wait
+            and now - self.last_served >= self.max_wait
+        )
+
+    def record_wait(self, wait):
+        self.completed += 1
+        self.total_wait += wait
+        self.max_observed_wait = max(self.max_observed_wait, wait)
+
+
+class InferenceScheduler:
+    """
+    Runs inference jobs on a fixed pool of worker threads, choosing the next job
+    from several priority lanes.
+
+    Lanes are served by smooth weighted round-robin, so under contention each
+    lane gets a share of the workers proportional to its weight, and an idle
+    lane's share goes to the others. A lane whose oldest job has waited longer
+    than its max_wait is served next, so low-weight lanes never starve.
+    Promotion happens at most once per max_wait, so a backlog of old jobs
+    cannot take over the workers.
+    """
+
+    def __init__(self, workers=2, lane_weights=None, max_wait=None):
+        lane_weights = lane_weights or {LANE_INTERACTIVE: 4, LANE_BULK: 1}
+        max_wait = max_wait or {}
+
+        self.lanes = {
+            name: Lane(name, weight, max_wait.get(name))
+            for name, weight in lane_weights.items()
+        }
+        self.workers = workers
+        self.in_flight = 0
+        self._condition = threading.Condition()
+        self._threads = []
+
+        for i in range(workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"inference-worker-{i}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, lane, fn, *args, **kwargs):
+        """
+        Queue `fn(*args, **kwargs)` on the given lane. Returns a Future.
+        """
+        if lane not in self.lanes:
+            raise ValueError(
+                f"Unknown lane '{lane}'. Allowed lanes: {', '.join(self.lanes)}"
+            )
+
+        future = Future()
+        with self._condition:
+            self.lanes[lane].queue.append((time.monotonic(), future, fn, args, kwargs))
+            self._condition.notify()
+
+        return future
+
+    def run(self, lane, fn, *args, **kwargs):
+        """
+        Queue a job and block until its result is available.
+        """
+        return self.submit(lane, fn, *args, **kwargs).result()
+
+    def _next_lane(self, now):
+        # Must be called with the condition held
+        pending = [lane for lane in self.lanes.values() if lane.queue]
+        if not pending:
+            return None
+
+        # Starvation protection: serve the lane that has been waiting longest
+        # past its limit, regardless of weights
+        starving = [lane for lane in pending if lane.is_starving(now)]
+        if starving:
+            return max(starving, key=lambda lane: lane.oldest_wait(now))
+
+        # Smooth weighted round-robin over lanes that have work
+        total_weight = 0
+        for lane in pending:
+            lane.current_weight += lane.weight
+            total_weight += lane.weight
+
+        chosen = max(pending, key=lambda lane: lane.current_weight)
+        chosen.current_weight -= total_weight
+        return chosen
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                lane = self._next_lane(time.monotonic())
+                while lane is None:
+                    self._condition.wait()
+                    lane = self._next_lane(time.monotonic())
+
+                enqueued_at, future, fn, args, kwargs = lane.queue.popleft()
+                lane.last_served = time.monotonic()
+                lane.record_wait(lane.last_served - enqueued_at)
+                self.in_flight += 1
+
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._condition:
+                    self.in_flight -= 1
+
+    def stats(self):
+        """
+        Return per-lane queue depth and wait-time statistics (in seconds).
+        """
+        now = time.monotonic()
+        with self._condition:
+            lanes = {}
+            for name, lane in self.lanes.items():
+                lanes[name] = {
+                    'weight': lane.weight,
+                    'max_wait': lane.max_wait,
+                    'queue_depth': len(lane.queue),
+                    'oldest_wait': round(lane.oldest_wait(now), 4),
+                    'completed': lane.completed,
+                    'avg_wait': round(lane.total_wait / lane.completed, 4) if lane.completed else 0.0,
+                    'max_observed_wait': round(lane.max_observed_wait, 4),
+                }
+
+            return {
+                'workers': self.workers,
+                'in_flight': self.in_flight,
+                'lanes': lanes,
+            }
+
+
+def get_scheduler():
+    """
+    Return the process-wide inference scheduler, creating it from the
+    INFERENCE_SCHEDULER setting on first use.
+    """
+    global _scheduler
+
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                config = getattr(settings, 'INFERENCE_SCHEDULER', {})
+                _scheduler = InferenceScheduler(
+                    workers=config.get('WORKERS', 2),
+                    lane_weights=config.get('LANE_WEIGHTS'),
+                    max_wait=config.get('MAX_WAIT_SECONDS'),
+                )
+
+    return _scheduler
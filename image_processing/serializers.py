@@ -1,4 +1,6 @@
+import os
 from rest_framework import serializers
+from .derivatives import DERIVATIVE_FORMATS, get_derivative_config, normalize_width
 
 
 class ImageUploadSerializer(serializers.Serializer):
@@ -58,4 +60,40 @@ class CartonDuplicationSerializer(serializers.Serializer):
     def validate_items_per_row(self, value):
         if value is not None and value not in [3, 4]:
             raise serializers.ValidationError("Items per row must be either 3 or 4.")
-        return value
\ No newline at end of file
+        return value
+
+
+class ProcessedImageExportSerializer(serializers.Serializer):
+    filenames = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        min_length=1,
+        max_length=500
+    )
+    archive_name = serializers.CharField(max_length=100, required=False, default='processed_images')
+    
+    def validate_filenames(self, value):
+        # Only plain filenames inside the processed directory are allowed
+        for filename in value:
+            if os.path.basename(filename) != filename or filename.startswith('.'):
+                raise serializers.ValidationError(f"Invalid filename: {filename}")
+        
+        # Remove duplicates while keeping the requested order
+        return list(dict.fromkeys(value))
+    
+    def validate_archive_name(self, value):
+        value = ''.join(c for c in value.strip() if c.isalnum() or c in '-_')
+        if not value:
+            raise serializers.ValidationError("Archive name must contain letters or digits.")
+        return value
+
+
+class MediaDerivativeSerializer(serializers.Serializer):
+    w = serializers.IntegerField(min_value=1, required=False)
+    fmt = serializers.ChoiceField(choices=list(DERIVATIVE_FORMATS), default='webp')
+    
+    def validate_w(self, value):
+        width = normalize_width(value)
+        if width is None:
+            allowed = ', '.join(str(w) for w in sorted(get_derivative_config()['WIDTHS']))
+            raise serializers.ValidationError(f"Width too large. Allowed widths: {allowed}")
+        return width
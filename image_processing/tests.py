@@ -1,3 +1,836 @@
-from django.test import TestCase
+import io
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from unittest import mock
+import requests
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+import numpy as np
+import onnxruntime as ort
+from PIL import Image, ImageDraw
+from .dedup import (
+    BAND_COUNT,
+    DUPLICATE_MAX_DISTANCE,
+    compute_dhash,
+    find_duplicate,
+    hamming_distance,
+    record_image_hash,
+    split_bands,
+)
+from . import derivatives
+from .export import EXPORT_CHUNK_SIZE, iter_zip_stream
+from .derivatives import evict_derivatives, normalize_width, record_derivative_write
+from .inference import build_session_options, get_inference_config
+from .loadtest import percentile, summarize
+from .management.commands.evaluate_quantized_model import compare_masks
+from .media import parse_range
+from .models import ProcessedImageHash
+from .scheduler import LANE_BULK, LANE_INTERACTIVE, InferenceScheduler
+from .utils import (
+    MAX_ASPECT_RATIO,
+    MIN_IMAGE_DIMENSION,
+    PRESCREEN_BYTES,
+    download_and_process_images,
+    prescreen_candidates,
+    score_candidate,
+)
+from .views import MediaFileView
 
-# Create your tests here.
+
+class MediaRootTestMixin:
+    """
+    Points MEDIA_ROOT at a temporary directory for the duration of each test.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.media_root, 'processed'))
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+    def write_media(self, name, data):
+        path = os.path.join(self.media_root, 'processed', name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+
+class InferenceSchedulerTests(SimpleTestCase):
+    def make_scheduler(self, lane_weights=None, max_wait=None):
+        # No worker threads, so lane selection can be stepped manually
+        return InferenceScheduler(workers=0, lane_weights=lane_weights, max_wait=max_wait)
+
+    def take(self, scheduler, now):
+        lane = scheduler._next_lane(now)
+        if lane is None:
+            return None
+        lane.queue.popleft()
+        lane.last_served = now
+        return lane.name
+
+    def test_lanes_are_served_by_weight(self):
+        scheduler = self.make_scheduler({LANE_INTERACTIVE: 4, LANE_BULK: 1})
+        for _ in range(10):
+            scheduler.submit(LANE_INTERACTIVE, lambda: None)
+            scheduler.submit(LANE_BULK, lambda: None)
+
+        now = time.monotonic()
+        order = [self.take(scheduler, now) for _ in range(10)]
+
+        self.assertEqual(order[:5].count(LANE_INTERACTIVE), 4)
+        self.assertEqual(order[5:].count(LANE_INTERACTIVE), 4)
+
+    def test_idle_lane_share_goes_to_other_lanes(self):
+        scheduler = self.make_scheduler({LANE_INTERACTIVE: 4, LANE_BULK: 1})
+        for _ in range(3):
+            scheduler.submit(LANE_BULK, lambda: None)
+
+        now = time.monotonic()
+        self.assertEqual(
+            [self.take(scheduler, now) for _ in range(4)],
+            [LANE_BULK, LANE_BULK, LANE_BULK, None],
+        )
+
+    def test_starving_lane_is_promoted_once_per_window(self):
+        scheduler = self.make_scheduler(
+            {LANE_INTERACTIVE: 100, LANE_BULK: 1}, max_wait={LANE_BULK: 10}
+        )
+        for _ in range(3):
+            scheduler.submit(LANE_BULK, lambda: None)
+        for _ in range(3):
+            scheduler.submit(LANE_INTERACTIVE, lambda: None)
+
+        now = time.monotonic() + 11
+        self.assertEqual(self.take(scheduler, now), LANE_BULK)
+        # Remaining bulk jobs are still overdue, but the lane was just served
+        self.assertEqual(self.take(scheduler, now + 1), LANE_INTERACTIVE)
+        self.assertEqual(self.take(scheduler, now + 11), LANE_BULK)
+
+    def test_unknown_lane_is_rejected(self):
+        scheduler = self.make_scheduler()
+        with self.assertRaises(ValueError):
+            scheduler.submit('batch', lambda: None)
+
+    def test_run_returns_results_and_updates_stats(self):
+        scheduler = InferenceScheduler(workers=1)
+
+        self.assertEqual(scheduler.run(LANE_INTERACTIVE, lambda x: x * 2, 21), 42)
+        self.assertEqual(scheduler.run(LANE_BULK, lambda: 'bulk'), 'bulk')
+        self.assertEqual(scheduler.run(LANE_BULK, lambda: 'bulk'), 'bulk')
+        with self.assertRaises(ZeroDivisionError):
+            scheduler.run(LANE_INTERACTIVE, lambda: 1 / 0)
+
+        stats = scheduler.stats()
+        self.assertEqual(stats['workers'], 1)
+        self.assertEqual(stats['lanes'][LANE_INTERACTIVE]['completed'], 2)
+        self.assertEqual(stats['lanes'][LANE_BULK]['completed'], 2)
+        self.assertEqual(stats['lanes'][LANE_BULK]['queue_depth'], 0)
+
+    def test_stats_report_queue_depth(self):
+        scheduler = InferenceScheduler(workers=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        blocker = scheduler.submit(LANE_BULK, block)
+        started.wait(5)
+        queued = [scheduler.submit(LANE_BULK, lambda: None) for _ in range(3)]
+
+        stats = scheduler.stats()
+        self.assertEqual(stats['in_flight'], 1)
+        self.assertEqual(stats['lanes'][LANE_BULK]['queue_depth'], 3)
+        self.assertEqual(stats['lanes'][LANE_INTERACTIVE]['queue_depth'], 0)
+
+        release.set()
+        blocker.result(5)
+        for future in queued:
+            future.result(5)
+        self.assertEqual(scheduler.stats()['lanes'][LANE_BULK]['queue_depth'], 0)
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_missing_or_unsupported_headers_are_ignored(self):
+        self.assertIsNone(parse_range(None, 100))
+        self.assertIsNone(parse_range('bytes=-', 100))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 100))
+        self.assertIsNone(parse_range('items=0-1', 100))
+
+    def test_explicit_and_open_ended_ranges(self):
+        self.assertEqual(parse_range('bytes=10-19', 100), (10, 19))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+
+    def test_suffix_range(self):
+        self.assertEqual(parse_range('bytes=-5', 100), (95, 99))
+        # Suffix longer than the file covers the whole file
+        self.assertEqual(parse_range('bytes=-500', 100), (0, 99))
+
+    def test_end_past_file_is_clamped(self):
+        self.assertEqual(parse_range('bytes=50-5000', 100), (50, 99))
+
+    def test_unsatisfiable_ranges(self):
+        self.assertIs(parse_range('bytes=100-', 100), False)
+        self.assertIs(parse_range('bytes=20-10', 100), False)
+        self.assertIs(parse_range('bytes=-0', 100), False)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], MEDIA_SERVING={'SENDFILE_BACKEND': ''})
+class MediaFileViewTests(MediaRootTestMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.body = bytes(range(256)) * 4
+        self.write_media('image.png', self.body)
+        self.url = '/media/processed/image.png'
+
+    def test_serves_file_with_cache_headers(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(response['ETag'].startswith('"'))
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_range_request_returns_partial_content(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.body)}')
+        self.assertEqual(b''.join(response.streaming_content), self.body[10:20])
+
+    def test_unsatisfiable_range_returns_416(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.body)}-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertNotIn('immutable', response.get('Cache-Control', ''))
+
+    def test_failed_precondition_is_not_cacheable(self):
+        response = self.client.get(self.url, HTTP_IF_MATCH='"stale"')
+
+        self.assertEqual(response.status_code, 412)
+        self.assertNotIn('immutable', response.get('Cache-Control', ''))
+
+    def test_if_range_mismatch_returns_full_file(self):
+        response = self.client.get(
+            self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+
+    def test_if_range_match_returns_partial_content(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE=etag)
+
+        self.assertEqual(response.status_code, 206)
+
+    def test_path_traversal_returns_404(self):
+        # A real file just outside MEDIA_ROOT
+        outside = f"{self.media_root}-secret.txt"
+        with open(outside, 'w') as f:
+            f.write('secret')
+        self.addCleanup(os.remove, outside)
+        request = RequestFactory().get('/media/')
+
+        with self.assertRaises(Http404):
+            MediaFileView.as_view()(request, path=f"../{os.path.basename(outside)}")
+        with self.assertRaises(Http404):
+            MediaFileView.as_view()(request, path=f"processed/../../{os.path.basename(outside)}")
+
+    def test_missing_file_returns_404(self):
+        response = self.client.get('/media/processed/missing.png')
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_offload_headers_are_percent_encoded(self):
+        self.write_media('кофе 1.png', self.body)
+
+        with override_settings(MEDIA_SERVING={'SENDFILE_BACKEND': 'x-accel-redirect'}):
+            response = self.client.get('/media/processed/кофе 1.png')
+
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/protected-media/processed/%D0%BA%D0%BE%D1%84%D0%B5%201.png',
+        )
+
+
+def make_product_image(size=(400, 400), image_format='PNG', offset=0):
+    image = Image.new('RGB', (400, 400), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((50 + offset, 80, 300 + offset, 350), fill='blue')
+    draw.rectangle((200, 20, 380, 150), fill='red')
+    image = image.resize(size)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class DHashTests(SimpleTestCase):
+    def test_hash_is_deterministic(self):
+        data = make_product_image()
+
+        self.assertEqual(compute_dhash(data), compute_dhash(data))
+        self.assertLess(compute_dhash(data), 1 << 64)
+
+    def test_rescaled_and_recompressed_copies_are_near_duplicates(self):
+        original = compute_dhash(make_product_image((800, 800), 'PNG'))
+        copy = compute_dhash(make_product_image((350, 350), 'JPEG'))
+
+        self.assertLessEqual(hamming_distance(original, copy), DUPLICATE_MAX_DISTANCE)
+
+    def test_different_images_are_not_duplicates(self):
+        first = compute_dhash(make_product_image())
+        other = Image.new('RGB', (400, 400), 'white')
+        ImageDraw.Draw(other).rectangle((0, 200, 400, 400), fill='black')
+        buffer = io.BytesIO()
+        other.save(buffer, format='PNG')
+
+        self.assertGreater(
+            hamming_distance(first, compute_dhash(buffer.getvalue())),
+            DUPLICATE_MAX_DISTANCE,
+        )
+
+    def test_bands_reassemble_the_hash(self):
+        dhash = 0x0123456789ABCDEF
+        bands = split_bands(dhash)
+
+        self.assertEqual(len(bands), BAND_COUNT)
+        self.assertEqual(sum(band << (16 * i) for i, band in enumerate(bands)), dhash)
+
+    def test_near_duplicates_share_a_band(self):
+        # Pigeonhole: flipping at most BAND_COUNT - 1 bits leaves a band intact
+        rng = random.Random(0)
+        for _ in range(200):
+            dhash = rng.getrandbits(64)
+            other = dhash
+            for bit in rng.sample(range(64), DUPLICATE_MAX_DISTANCE):
+                other ^= 1 << bit
+
+            shared = [a == b for a, b in zip(split_bands(dhash), split_bands(other))]
+            self.assertTrue(any(shared))
+
+
+class FindDuplicateTests(MediaRootTestMixin, TestCase):
+    def test_finds_near_duplicate_with_existing_file(self):
+        self.write_media('kept.png', b'png')
+        dhash = 0x0123456789ABCDEF
+        record_image_hash(dhash, 'kept.png', 'http://example.com/a.jpg')
+
+        entry = find_duplicate(dhash ^ 0b101)
+
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry.filename, 'kept.png')
+
+    def test_distant_hash_is_not_a_duplicate(self):
+        self.write_media('kept.png', b'png')
+        dhash = 0x0123456789ABCDEF
+        record_image_hash(dhash, 'kept.png')
+
+        # Same lowest band, but many differing bits elsewhere
+        self.assertIsNone(find_duplicate(dhash ^ (0xFFFF << 16)))
+
+    def test_entries_with_missing_files_are_pruned(self):
+        dhash = 0x0123456789ABCDEF
+        record_image_hash(dhash, 'deleted.png')
+
+        self.assertIsNone(find_duplicate(dhash))
+        self.assertFalse(ProcessedImageHash.objects.filter(filename='deleted.png').exists())
+
+
+@override_settings(
+    ALLOWED_HOSTS=['testserver'],
+    MEDIA_SERVING={'SENDFILE_BACKEND': ''},
+    MEDIA_DERIVATIVES={'CACHE_DIR': 'derivatives', 'WIDTHS': (64, 128, 256), 'MAX_CACHE_BYTES': 1000},
+)
+class MediaDerivativeTests(MediaRootTestMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write_media('image.png', make_product_image((400, 400)))
+        self.cache_root = os.path.join(self.media_root, 'derivatives')
+        derivatives._cache_state.update(size=None, scanned_at=0.0)
+
+    def write_cache_file(self, name, size, accessed):
+        os.makedirs(self.cache_root, exist_ok=True)
+        path = os.path.join(self.cache_root, name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        os.utime(path, (accessed, accessed))
+        return path
+
+    def test_normalize_width_rounds_up_to_allowed_width(self):
+        self.assertEqual(normalize_width(1), 64)
+        self.assertEqual(normalize_width(128), 128)
+        self.assertEqual(normalize_width(129), 256)
+        self.assertIsNone(normalize_width(257))
+
+    def test_resized_webp_is_generated_and_cached(self):
+        response = self.client.get('/media/processed/image.png?w=100&fmt=webp')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        image = Image.open(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (128, 128))
+
+        etag = response['ETag']
+        repeat = self.client.get('/media/processed/image.png?w=100&fmt=webp', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_invalid_parameters_return_400(self):
+        for query in ('w=5000', 'w=abc', 'w=0', 'fmt=gif'):
+            response = self.client.get(f'/media/processed/image.png?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_eviction_removes_least_recently_used_first(self):
+        now = time.time()
+        oldest = self.write_cache_file('oldest.png', 400, now - 300)
+        older = self.write_cache_file('older.png', 400, now - 200)
+        newest = self.write_cache_file('newest.png', 400, now - 100)
+
+        evict_derivatives()
+
+        self.assertFalse(os.path.exists(oldest))
+        self.assertTrue(os.path.exists(older))
+        self.assertTrue(os.path.exists(newest))
+        self.assertEqual(derivatives._cache_state['size'], 800)
+
+    def test_eviction_never_removes_kept_file(self):
+        now = time.time()
+        kept = self.write_cache_file('kept.png', 900, now - 300)
+        newer = self.write_cache_file('newer.png', 900, now - 100)
+
+        evict_derivatives(keep=kept)
+
+        self.assertTrue(os.path.exists(kept))
+        self.assertFalse(os.path.exists(newer))
+
+    def test_writes_under_the_limit_do_not_rescan(self):
+        derivatives._cache_state.update(size=100, scanned_at=time.monotonic())
+
+        with mock.patch.object(derivatives, 'evict_derivatives') as evict:
+            record_derivative_write(200)
+            self.assertFalse(evict.called)
+            self.assertEqual(derivatives._cache_state['size'], 300)
+
+            record_derivative_write(800)
+            self.assertTrue(evict.called)
+
+
+class LoadTestStatsTests(SimpleTestCase):
+    def test_percentile_uses_nearest_rank(self):
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 50), 3)
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2)
+        self.assertEqual(percentile(list(range(1, 31)), 95), 29)
+        self.assertEqual(percentile(list(range(1, 31)), 99), 30)
+        self.assertEqual(percentile(list(range(1, 101)), 7), 7)
+
+    def test_percentile_edges(self):
+        self.assertEqual(percentile([], 50), 0.0)
+        self.assertEqual(percentile([7], 99), 7)
+        self.assertEqual(percentile([3, 1, 2], 0), 1)
+        self.assertEqual(percentile([3, 1, 2], 100), 3)
+
+    def test_summarize_odd_sample_size(self):
+        results = [('search', 200, latency) for latency in (0.1, 0.2, 0.3, 0.4)]
+        results.append(('remove', 500, 0.5))
+
+        summary = summarize(results, 2.0)
+
+        self.assertEqual(summary['requests'], 5)
+        self.assertEqual(summary['errors'], 1)
+        self.assertEqual(summary['statuses'], {'200': 4, '500': 1})
+        self.assertEqual(summary['throughput_rps'], 2.5)
+        self.assertEqual(summary['latency_ms'], {
+            'mean': 300.0, 'p50': 300.0, 'p95': 500.0, 'p99': 500.0, 'max': 500.0,
+        })
+
+    def test_summarize_even_sample_size(self):
+        results = [('search', 200, latency) for latency in (0.4, 0.1, 0.3, 0.2)]
+        results += [('search', 'ConnectTimeout', 0.6), ('search', 404, 0.5)]
+
+        summary = summarize(results, 3.0)
+
+        self.assertEqual(summary['requests'], 6)
+        self.assertEqual(summary['errors'], 2)
+        self.assertEqual(summary['statuses'], {'200': 4, 'ConnectTimeout': 1, '404': 1})
+        self.assertEqual(summary['throughput_rps'], 2.0)
+        self.assertEqual(summary['latency_ms']['p50'], 300.0)
+        self.assertEqual(summary['latency_ms']['p95'], 600.0)
+        self.assertEqual(summary['latency_ms']['max'], 600.0)
+
+    def test_summarize_empty_results(self):
+        summary = summarize([], 0)
+
+        self.assertEqual(summary['requests'], 0)
+        self.assertEqual(summary['throughput_rps'], 0.0)
+        self.assertEqual(summary['latency_ms']['mean'], 0.0)
+        self.assertEqual(summary['latency_ms']['max'], 0.0)
+
+
+def make_noise_image(size, seed, image_format='JPEG', **save_options):
+    # Noise keeps images large (several probe chunks) and never near-duplicates
+    rng = random.Random(seed)
+    image = Image.frombytes('RGB', size, rng.randbytes(size[0] * size[1] * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **save_options)
+    return buffer.getvalue()
+
+
+class FakeImageResponse:
+    """
+    Minimal stand-in for a requests response that records how much of the
+    body was read and whether the connection was closed.
+    """
+
+    def __init__(self, body, content_type, fail_after=None):
+        self.body = body
+        self.headers = {'content-type': content_type}
+        self.fail_after = fail_after
+        self.bytes_read = 0
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    @property
+    def content(self):
+        self.bytes_read = len(self.body)
+        return self.body
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.body), chunk_size):
+            if self.fail_after is not None and start >= self.fail_after:
+                raise requests.ConnectionError('connection reset by peer')
+            chunk = self.body[start:start + chunk_size]
+            self.bytes_read += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeImageHostMixin:
+    """
+    Serves registered bodies through a mocked requests.get.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.bodies = {}
+        self.responses = {}
+        patcher = mock.patch('image_processing.utils.requests.get', side_effect=self.fake_get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_get(self, url, stream=False, timeout=None):
+        body, content_type, fail_after = self.bodies[url]
+        # Only streamed reads fail, so a later full fetch of the URL succeeds
+        response = FakeImageResponse(body, content_type, fail_after if stream else None)
+        self.responses.setdefault(url, []).append(response)
+        return response
+
+    def serve(self, url, body, content_type='image/jpeg', fail_after=None):
+        self.bodies[url] = (body, content_type, fail_after)
+        return url
+
+
+class PrescreenCandidateTests(FakeImageHostMixin, SimpleTestCase):
+    def test_thumbnails_banners_and_unsupported_formats_are_rejected(self):
+        short_side = MIN_IMAGE_DIMENSION * 2
+        banner_width = int(short_side * MAX_ASPECT_RATIO) + 10
+        urls = [
+            self.serve('http://img/thumb.jpg', make_noise_image((MIN_IMAGE_DIMENSION - 1,) * 2, 1)),
+            self.serve('http://img/banner.jpg', make_noise_image((banner_width, short_side), 2)),
+            self.serve('http://img/anim.gif', make_noise_image((500, 500), 3, 'GIF'), 'image/gif'),
+            self.serve('http://img/page.html', b'<html></html>', 'text/html'),
+            self.serve('http://img/good.jpg', make_noise_image((500, 500), 4)),
+        ]
+
+        candidates = prescreen_candidates(urls, 3)
+
+        self.assertEqual([c['url'] for c in candidates], ['http://img/good.jpg'])
+        for responses in self.responses.values():
+            self.assertTrue(all(response.closed for response in responses))
+
+    def test_unknown_size_candidate_is_kept_as_last_fallback(self):
+        # The dimensions come after a large ICC profile, beyond the probed prefix
+        big_header = make_noise_image((600, 600), 1, icc_profile=b'\0' * (PRESCREEN_BYTES * 2))
+        urls = [
+            self.serve('http://img/icc.jpg', big_header),
+            self.serve('http://img/small.jpg', make_noise_image((400, 400), 2)),
+            self.serve('http://img/large.jpg', make_noise_image((800, 800), 3)),
+        ]
+
+        candidates = prescreen_candidates(urls, 2)
+
+        self.assertEqual(
+            [c['url'] for c in candidates],
+            ['http://img/large.jpg', 'http://img/small.jpg', 'http://img/icc.jpg'],
+        )
+        fallback = candidates[-1]
+        self.assertIsNone(fallback['width'])
+        self.assertEqual(score_candidate(fallback), 0)
+        self.assertIsNone(fallback['data'])
+        self.assertTrue(self.responses['http://img/icc.jpg'][0].closed)
+
+    def test_only_top_candidates_are_downloaded(self):
+        sizes = {'a': 400, 'b': 900, 'c': 600, 'd': 800}
+        bodies = {
+            name: make_noise_image((size, size), seed)
+            for seed, (name, size) in enumerate(sizes.items())
+        }
+        urls = [self.serve(f'http://img/{name}.jpg', body) for name, body in bodies.items()]
+
+        candidates = prescreen_candidates(urls, 2)
+
+        self.assertEqual(
+            [c['url'] for c in candidates],
+            ['http://img/b.jpg', 'http://img/d.jpg', 'http://img/c.jpg', 'http://img/a.jpg'],
+        )
+        self.assertEqual(candidates[0]['data'], bodies['b'])
+        self.assertEqual(candidates[1]['data'], bodies['d'])
+        self.assertIsNone(candidates[2]['data'])
+        self.assertIsNone(candidates[3]['data'])
+        for name in ('a', 'c'):
+            response, = self.responses[f'http://img/{name}.jpg']
+            self.assertTrue(response.closed)
+            self.assertLessEqual(response.bytes_read, PRESCREEN_BYTES)
+        for responses in self.responses.values():
+            self.assertTrue(all(response.closed for response in responses))
+
+    def test_failed_top_download_falls_back_to_fetch_image(self):
+        body = make_noise_image((800, 800), 1)
+        urls = [self.serve('http://img/flaky.jpg', body, fail_after=PRESCREEN_BYTES)]
+
+        candidates = prescreen_candidates(urls, 1)
+        self.assertIsNone(candidates[0]['data'])
+
+        with mock.patch('image_processing.utils.search_product_images', return_value=urls), \
+                mock.patch('image_processing.utils.find_duplicate', return_value=None), \
+                mock.patch('image_processing.utils.remove_background',
+                           side_effect=lambda image_file, lane: image_file.read()) as remove:
+            results = download_and_process_images('flaky product', num_images=1)
+
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['processed_image'], body)
+        self.assertEqual(remove.call_count, 1)
+        # Probe stream in each pre-screen, then one full fetch after the failure
+        self.assertEqual(len(self.responses['http://img/flaky.jpg']), 3)
+
+
+class DownloadDeduplicationTests(FakeImageHostMixin, SimpleTestCase):
+    def run_download(self, urls, num_images, remove_side_effect):
+        with mock.patch('image_processing.utils.search_product_images', return_value=urls), \
+                mock.patch('image_processing.utils.find_duplicate', return_value=None), \
+                mock.patch('image_processing.utils.remove_background',
+                           side_effect=remove_side_effect) as remove:
+            return download_and_process_images('product', num_images=num_images), remove
+
+    def test_near_duplicates_in_one_request_are_skipped(self):
+        urls = [
+            self.serve('http://img/a.png', make_product_image((800, 800), 'PNG'), 'image/png'),
+            self.serve('http://img/a-copy.jpg', make_product_image((700, 700), 'JPEG')),
+        ]
+
+        results, remove = self.run_download(urls, 2, lambda image_file, lane: b'out')
+
+        self.assertEqual([r['original_url'] for r in results], ['http://img/a.png'])
+        self.assertEqual(remove.call_count, 1)
+
+    def test_near_duplicate_replaces_candidate_whose_inference_failed(self):
+        urls = [
+            self.serve('http://img/a.png', make_product_image((800, 800), 'PNG'), 'image/png'),
+            self.serve('http://img/a-copy.jpg', make_product_image((700, 700), 'JPEG')),
+        ]
+
+        results, remove = self.run_download(
+            urls, 1, [RuntimeError('inference failed'), b'out']
+        )
+
+        self.assertEqual([r['original_url'] for r in results], ['http://img/a-copy.jpg'])
+        self.assertEqual(results[0]['index'], 1)
+        self.assertEqual(remove.call_count, 2)
+
+
+class ZipStreamTests(MediaRootTestMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(0)
+        self.png_data = rng.randbytes(EXPORT_CHUNK_SIZE * 3 + 100)
+        self.text_data = b'product list\n' * 20000
+        self.paths = [
+            self.write_media('a.png', self.png_data),
+            self.write_media('b.txt', self.text_data),
+        ]
+
+    def test_stream_is_a_valid_archive(self):
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(iter_zip_stream(self.paths))))
+
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), ['a.png', 'b.txt'])
+        self.assertEqual(archive.read('a.png'), self.png_data)
+        self.assertEqual(archive.read('b.txt'), self.text_data)
+
+    def test_images_are_stored_and_other_files_deflated(self):
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(iter_zip_stream(self.paths))))
+
+        self.assertEqual(archive.getinfo('a.png').compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.getinfo('b.txt').compress_type, zipfile.ZIP_DEFLATED)
+        # Sizes follow each entry in a data descriptor, as the output cannot seek
+        for info in archive.infolist():
+            self.assertTrue(info.flag_bits & 0x08)
+
+    def test_chunks_stay_close_to_chunk_size(self):
+        chunks = list(iter_zip_stream(self.paths))
+
+        self.assertGreater(len(chunks), 4)
+        self.assertLessEqual(max(len(chunk) for chunk in chunks), EXPORT_CHUNK_SIZE + 1024)
+
+
+class ProcessedImageExportViewTests(MediaRootTestMixin, SimpleTestCase):
+    url = '/api/export-images/'
+
+    def test_exports_requested_files(self):
+        self.write_media('a.png', make_product_image())
+        self.write_media('b.png', make_product_image(offset=40))
+
+        response = self.client.get(self.url, {'filenames': ['a.png', 'b.png']})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(archive.namelist(), ['a.png', 'b.png'])
+
+    def test_path_components_are_rejected(self):
+        self.write_media('a.png', make_product_image())
+
+        for filename in ('../x', 'sub/a.png', '.hidden'):
+            response = self.client.post(
+                self.url, {'filenames': [filename]}, content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400, filename)
+
+    def test_missing_files_are_listed(self):
+        self.write_media('a.png', make_product_image())
+
+        response = self.client.post(
+            self.url,
+            {'filenames': ['a.png', 'gone.png', 'also-gone.png']},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['missing'], ['gone.png', 'also-gone.png'])
+
+    def test_archive_name_is_sanitized(self):
+        self.write_media('a.png', make_product_image())
+
+        response = self.client.post(
+            self.url,
+            {'filenames': ['a.png'], 'archive_name': 'x"; filename=../evil\r\n'},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="xfilenameevil.zip"')
+        # Consume the stream so the archived files are closed
+        b''.join(response.streaming_content)
+
+
+class SessionOptionsTests(SimpleTestCase):
+    def test_config_reaches_session_options(self):
+        options = build_session_options(get_inference_config(
+            INTRA_OP_NUM_THREADS=3,
+            INTER_OP_NUM_THREADS=2,
+            GRAPH_OPTIMIZATION_LEVEL='Extended',
+            EXECUTION_MODE='parallel',
+            ENABLE_CPU_MEM_ARENA=False,
+            ENABLE_MEM_PATTERN=False,
+        ))
+
+        self.assertEqual(options.intra_op_num_threads, 3)
+        self.assertEqual(options.inter_op_num_threads, 2)
+        self.assertEqual(
+            options.graph_optimization_level, ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+        )
+        self.assertEqual(options.execution_mode, ort.ExecutionMode.ORT_PARALLEL)
+        self.assertFalse(options.enable_cpu_mem_arena)
+        self.assertFalse(options.enable_mem_pattern)
+
+    def test_defaults(self):
+        options = build_session_options(get_inference_config(
+            INTRA_OP_NUM_THREADS=0,
+            GRAPH_OPTIMIZATION_LEVEL='all',
+            EXECUTION_MODE='sequential',
+            ENABLE_CPU_MEM_ARENA=True,
+        ))
+
+        self.assertEqual(options.intra_op_num_threads, 0)
+        self.assertEqual(options.graph_optimization_level, ort.GraphOptimizationLevel.ORT_ENABLE_ALL)
+        self.assertEqual(options.execution_mode, ort.ExecutionMode.ORT_SEQUENTIAL)
+        self.assertTrue(options.enable_cpu_mem_arena)
+
+    def test_invalid_values_are_rejected(self):
+        with self.assertRaises(ValueError):
+            build_session_options(get_inference_config(GRAPH_OPTIMIZATION_LEVEL='max'))
+        with self.assertRaises(ValueError):
+            build_session_options(get_inference_config(EXECUTION_MODE='async'))
+
+
+class CompareMasksTests(SimpleTestCase):
+    def test_identical_masks(self):
+        mask = np.array([[0.0, 0.2], [0.8, 1.0]], dtype=np.float32)
+
+        metrics = compare_masks(mask, mask.copy())
+
+        self.assertEqual(metrics, {'mean_abs_error': 0.0, 'max_abs_error': 0.0, 'iou': 1.0})
+
+    def test_error_and_iou(self):
+        reference = np.array([[1.0, 1.0], [0.0, 0.0]], dtype=np.float32)
+        candidate = np.array([[1.0, 0.25], [0.5, 0.0]], dtype=np.float32)
+
+        metrics = compare_masks(reference, candidate)
+
+        self.assertAlmostEqual(metrics['mean_abs_error'], (0.75 + 0.5) / 4)
+        self.assertAlmostEqual(metrics['max_abs_error'], 0.75)
+        # Foregrounds {(0,0), (0,1)} and {(0,0), (1,0)} at the 0.5 threshold
+        self.assertAlmostEqual(metrics['iou'], 1 / 3)
+
+    def test_threshold_is_applied(self):
+        reference = np.array([[0.6, 0.0]], dtype=np.float32)
+        candidate = np.array([[0.4, 0.0]], dtype=np.float32)
+
+        self.assertEqual(compare_masks(reference, candidate)['iou'], 0.0)
+        self.assertEqual(compare_masks(reference, candidate, threshold=0.3)['iou'], 1.0)
+
+    def test_empty_union_counts_as_full_overlap(self):
+        reference = np.zeros((4, 4), dtype=np.float32)
+        candidate = np.full((4, 4), 0.1, dtype=np.float32)
+
+        metrics = compare_masks(reference, candidate)
+
+        self.assertEqual(metrics['iou'], 1.0)
+        self.assertAlmostEqual(metrics['mean_abs_error'], 0.1)
@@ -1,8 +1,16 @@
 from django.urls import path
-from .views import RemoveBackgroundView, ProductImageSearchView, CartonDuplicationView
+from .views import (
+    RemoveBackgroundView,
+    ProductImageSearchView,
+    CartonDuplicationView,
+    InferenceSchedulerStatsView,
+    ProcessedImageExportView,
+)
 
 urlpatterns = [
     path('remove-background/', RemoveBackgroundView.as_view(), name='remove-background'),
     path('search-product-images/', ProductImageSearchView.as_view(), name='search-product-images'),
     path('create-carton/', CartonDuplicationView.as_view(), name='create-carton'),
+    path('scheduler-stats/', InferenceSchedulerStatsView.as_view(), name='scheduler-stats'),
+    path('export-images/', ProcessedImageExportView.as_view(), name='export-images'),
 ]
\ No newline at end of file
@@ -2,10 +2,14 @@ import io
 import os
 import requests
 import math
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageFile
 from rembg import remove
 from django.core.files.base import ContentFile
 from googleapiclient.discovery import build
+from .inference import get_session
+from .dedup import compute_dhash, find_duplicate, is_near_duplicate
+from .scheduler import LANE_BULK, LANE_INTERACTIVE, get_scheduler
 
 
 def crop_transparent_areas(image):
@@ -71,7 +75,15 @@ def remove_edge_artifacts(image, threshold=30):
         return Image.new('RGBA', (1, 1), (0, 0, 0, 0))
 
 
-def remove_background(image_file):
+def run_matting(image_data, lane=LANE_INTERACTIVE):
+    """
+    Run rembg on raw image bytes through the inference scheduler.
+    `lane` selects the priority lane the job is queued on.
+    """
+    return get_scheduler().run(lane, remove, image_data, session=get_session())
+
+
+def remove_background(image_file, lane=LANE_INTERACTIVE):
     """
     Remove background, crop empty spaces, add custom background, and resize to 1080x1080.
     Returns a ContentFile with the processed image.
@@ -79,8 +91,8 @@ def remove_background(image_file):
     # Read the uploaded image
     image_data = image_file.read()
     
-    # Remove background using rembg
-    output_data = remove(image_data)
+    # Remove background using rembg with the shared, tuned ONNX session
+    output_data = run_matting(image_data, lane)
     
     # Convert to PIL Image
     output_image = Image.open(io.BytesIO(output_data))
@@ -144,12 +156,15 @@ def search_product_images(product_name, num_images=3):
     """
     api_key = os.getenv('API_KEY')
     cse_id = os.getenv('GOOGLE_CSE_ID')
+    # Optional override of the API root, e.g. a local stand-in for load tests
+    api_endpoint = os.getenv('GOOGLE_CSE_ENDPOINT')
     
     if not api_key or not cse_id:
         raise ValueError("Google API key or Custom Search Engine ID not configured")
     
     try:
-        service = build("customsearch", "v1", developerKey=api_key)
+        client_options = {'api_endpoint': api_endpoint} if api_endpoint else None
+        service = build("customsearch", "v1", developerKey=api_key, client_options=client_options)
         
         # Perform the search with image search type
         result = service.cse().list(
@@ -174,43 +189,229 @@ def search_product_images(product_name, num_images=3):
         raise Exception(f"Google Custom Search API error: {str(e)}")
 
 
-def download_and_process_images(product_name, num_images=3):
+# Candidate pre-screening: only the first few KB of each search result are read
+# to get its format and dimensions before committing to a full download.
+PRESCREEN_BYTES = 16 * 1024
+PRESCREEN_CHUNK_SIZE = 4 * 1024
+PRESCREEN_WORKERS = 5
+CANDIDATE_MULTIPLIER = 3
+MAX_SEARCH_RESULTS = 10  # Custom Search API limit per request
+MIN_IMAGE_DIMENSION = 300
+MAX_ASPECT_RATIO = 2.5
+ALLOWED_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+def probe_image(url, max_bytes=PRESCREEN_BYTES, timeout=10):
     """
-    Search for product images, download them, and process each one.
-    Returns a list of processed image ContentFiles with their original URLs.
+    Open a streaming request for an image URL and read only enough of the body
+    to determine its format and dimensions.
+    Returns a candidate dict (with the still-open response) or None if the URL
+    is not a usable image. If the dimensions are not within the first
+    `max_bytes` (e.g. JPEGs with large ICC/EXIF headers), format, width and
+    height are None and the candidate is kept as a fallback.
     """
     try:
-        # Search for images
-        image_urls = search_product_images(product_name, num_images)
+        response = requests.get(url, stream=True, timeout=timeout)
+        response.raise_for_status()
+    except Exception:
+        return None
+
+    content_type = response.headers.get('content-type', '')
+    if not content_type.startswith('image/'):
+        response.close()
+        return None
+
+    parser = ImageFile.Parser()
+    chunks = response.iter_content(chunk_size=PRESCREEN_CHUNK_SIZE)
+    prefix = b''
+
+    try:
+        for chunk in chunks:
+            prefix += chunk
+            parser.feed(chunk)
+            if parser.image is not None or len(prefix) >= max_bytes:
+                break
+    except Exception:
+        response.close()
+        return None
+
+    if parser.image is not None:
+        image_format = parser.image.format
+        width, height = parser.image.size
+    else:
+        image_format = width = height = None
+
+    return {
+        'url': url,
+        'format': image_format,
+        'width': width,
+        'height': height,
+        'prefix': prefix,
+        'chunks': chunks,
+        'response': response,
+    }
+
+
+def score_candidate(candidate):
+    """
+    Score a probed candidate. Returns None if it should be rejected, otherwise
+    a number where higher is better (large, roughly square product shots).
+    Candidates whose size is not known yet score 0, below every accepted size.
+    """
+    if candidate['width'] is None:
+        return 0
+
+    if candidate['format'] not in ALLOWED_IMAGE_FORMATS:
+        return None
+
+    short_side = min(candidate['width'], candidate['height'])
+    long_side = max(candidate['width'], candidate['height'])
+
+    # Reject thumbnails and banner-shaped images
+    if short_side < MIN_IMAGE_DIMENSION:
+        return None
+    if long_side / short_side > MAX_ASPECT_RATIO:
+        return None
+
+    return short_side * short_side / long_side
+
+
+def prescreen_candidates(image_urls, num_downloads):
+    """
+    Probe every candidate URL, reject unusable ones and return the rest ranked
+    best first. The bodies of the best `num_downloads` candidates are read in
+    full (stored under 'data'); every other connection is closed, so no socket
+    stays open while images wait for inference. Fallback candidates have
+    'data' set to None and are fetched again only if needed.
+    """
+    with ThreadPoolExecutor(max_workers=PRESCREEN_WORKERS) as executor:
+        probed = list(executor.map(probe_image, image_urls))
+
+        ranked = []
+        for position, candidate in enumerate(probed):
+            if candidate is None:
+                continue
+            score = score_candidate(candidate)
+            if score is None:
+                candidate['response'].close()
+                continue
+            ranked.append((score, -position, candidate))
+
+        # Best score first; ties keep the search engine's ordering
+        ranked.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        candidates = [candidate for _, _, candidate in ranked]
+
+        for candidate in candidates[num_downloads:]:
+            candidate['response'].close()
+        downloads = list(executor.map(finish_download, candidates[:num_downloads]))
+
+    for candidate, data in zip(candidates, downloads + [None] * len(candidates)):
+        candidate['data'] = data
+        for key in ('prefix', 'chunks', 'response'):
+            del candidate[key]
+
+    return candidates
+
+
+def finish_download(candidate):
+    """
+    Read the remainder of a pre-screened candidate's body and return the full
+    bytes, or None if the download fails.
+    """
+    try:
+        return candidate['prefix'] + b''.join(candidate['chunks'])
+    except Exception:
+        return None
+    finally:
+        candidate['response'].close()
+
+
+def fetch_image(url, timeout=10):
+    """
+    Download an image URL in full. Returns the bytes.
+    """
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    
+    content_type = response.headers.get('content-type', '')
+    if not content_type.startswith('image/'):
+        raise ValueError(f"Not an image: {content_type}")
+    
+    return response.content
+
+
+def download_and_process_images(product_name, num_images=3, lane=LANE_BULK):
+    """
+    Search for product images, pre-screen the candidates, then download and
+    process only the best ones. Near-duplicates of an image already picked in
+    this request are dropped, and near-duplicates of an image processed in an
+    earlier request reuse that output instead of running inference again.
+    Returns a list of dicts with either a processed image ContentFile or the
+    filename of an existing output, plus the original URL and dHash.
+    Inference is queued on the bulk lane by default.
+    """
+    try:
+        # Search for more candidates than needed so rejected ones can be replaced
+        num_candidates = min(MAX_SEARCH_RESULTS, num_images * CANDIDATE_MULTIPLIER)
+        image_urls = search_product_images(product_name, num_candidates)
         
         if not image_urls:
             return []
         
+        candidates = prescreen_candidates(image_urls, num_images)
+        
         processed_images = []
+        seen_hashes = []
         
-        for i, url in enumerate(image_urls):
+        for candidate in candidates:
+            if len(processed_images) >= num_images:
+                break
+            
             try:
-                # Download image
-                response = requests.get(url, stream=True, timeout=10)
-                response.raise_for_status()
+                # Fallbacks (and failed downloads) are fetched only when needed
+                image_data = candidate['data'] or fetch_image(candidate['url'])
+                
+                if candidate['width'] is None:
+                    # Size was not in the probed prefix; screen the full image now
+                    with Image.open(io.BytesIO(image_data)) as image:
+                        candidate['format'] = image.format
+                        candidate['width'], candidate['height'] = image.size
+                    if score_candidate(candidate) is None:
+                        continue
+                
+                # Drop near-duplicates before spending inference on them
+                dhash = compute_dhash(image_data)
+                if any(is_near_duplicate(dhash, seen) for seen in seen_hashes):
+                    continue
+                
+                index = len(processed_images) + 1
                 
-                # Check if it's an image by content type
-                content_type = response.headers.get('content-type', '')
-                if not content_type.startswith('image/'):
+                existing = find_duplicate(dhash)
+                if existing is not None:
+                    processed_images.append({
+                        'existing_filename': existing.filename,
+                        'original_url': candidate['url'],
+                        'index': index,
+                        'dhash': dhash
+                    })
+                    seen_hashes.append(dhash)
                     continue
                 
-                # Create ContentFile from downloaded image
-                image_content = ContentFile(response.content)
-                image_content.name = f"{product_name}_{i+1}.jpg"
+                image_content = ContentFile(image_data)
+                image_content.name = f"{product_name}_{index}.jpg"
                 
                 # Process the image (remove background)
-                processed_image = remove_background(image_content)
+                processed_image = remove_background(image_content, lane)
                 
                 processed_images.append({
                     'processed_image': processed_image,
-                    'original_url': url,
-                    'index': i + 1
+                    'original_url': candidate['url'],
+                    'index': index,
+                    'dhash': dhash
                 })
+                # Only picked images block their near-duplicates; if inference
+                # failed above, a near-duplicate can still take this slot
+                seen_hashes.append(dhash)
                 
             except Exception as e:
                 # Skip this image and continue with others
@@ -222,7 +423,7 @@ def download_and_process_images(product_name, num_images=3):
         raise Exception(f"Image processing error: {str(e)}")
 
 
-def duplicate_items_for_carton(image_input, quantity, items_per_row=None, canvas_size=(1080, 1080), margin=250):
+def duplicate_items_for_carton(image_input, quantity, items_per_row=None, canvas_size=(1080, 1080), margin=250, lane=LANE_INTERACTIVE):
     """
     Duplicate a single item to show multiple items in a carton arrangement.
     New workflow: Remove background -> Arrange transparent images -> Add background at the end
@@ -233,6 +434,7 @@ def duplicate_items_for_carton(image_input, quantity, items_per_row=None, canvas
         items_per_row: Number of items per row (3 or 4), auto-calculated if None
         canvas_size: Output canvas dimensions (width, height)
         margin: Padding around the entire arrangement (default 250px from all edges)
+        lane: Inference scheduler lane used for background removal
         
     Returns:
         ContentFile with the duplicated items arrangement
@@ -248,7 +450,7 @@ def duplicate_items_for_carton(image_input, quantity, items_per_row=None, canvas
     else:
         # Uploaded file - remove background first
         image_data = image_input.read()
-        output_data = remove(image_data)
+        output_data = run_matting(image_data, lane)
         single_item = Image.open(io.BytesIO(output_data)).convert('RGBA')
         # Crop transparent areas aggressively
         single_item = crop_transparent_areas(single_item)
@@ -4,8 +4,23 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.conf import settings
-from .serializers import ImageUploadSerializer, ProductSearchSerializer, CartonDuplicationSerializer
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.views import View
+from .serializers import (
+    ImageUploadSerializer,
+    ProductSearchSerializer,
+    CartonDuplicationSerializer,
+    ProcessedImageExportSerializer,
+    MediaDerivativeSerializer,
+)
 from .utils import remove_background, download_and_process_images, duplicate_items_for_carton
+from .dedup import record_image_hash
+from .scheduler import get_scheduler
+from .export import iter_zip_stream
+from .media import file_etag, serve_file
+from .derivatives import get_or_create_derivative
 
 
 class RemoveBackgroundView(APIView):
@@ -92,13 +107,20 @@ class ProductImageSearchView(APIView):
             os.makedirs(media_path, exist_ok=True)
             
             for img_data in processed_images:
-                # Generate unique filename
-                unique_filename = f"{uuid.uuid4().hex}_{product_name}_{img_data['index']}.png"
-                file_path = os.path.join(media_path, unique_filename)
-                
-                # Save processed image
-                with open(file_path, 'wb') as f:
-                    f.write(img_data['processed_image'].read())
+                if 'existing_filename' in img_data:
+                    # Near-duplicate of an image processed in an earlier request
+                    unique_filename = img_data['existing_filename']
+                else:
+                    # Generate unique filename
+                    unique_filename = f"{uuid.uuid4().hex}_{product_name}_{img_data['index']}.png"
+                    file_path = os.path.join(media_path, unique_filename)
+                    
+                    # Save processed image
+                    with open(file_path, 'wb') as f:
+                        f.write(img_data['processed_image'].read())
+                    
+                    # Remember the image so later duplicates can reuse this output
+                    record_image_hash(img_data['dhash'], unique_filename, img_data['original_url'])
                 
                 # Generate download URL
                 download_url = f"{settings.MEDIA_URL}processed/{unique_filename}"
@@ -107,7 +129,8 @@ class ProductImageSearchView(APIView):
                     'index': img_data['index'],
                     'original_url': img_data['original_url'],
                     'processed_image_url': download_url,
-                    'filename': unique_filename
+                    'filename': unique_filename,
+                    'duplicate': 'existing_filename' in img_data
                 })
             
             return Response({
@@ -180,3 +203,118 @@ class CartonDuplicationView(APIView):
                 'success': False,
                 'error': f'Carton creation failed: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class InferenceSchedulerStatsView(APIView):
+    """
+    API endpoint exposing per-lane queue depth and wait times of the inference scheduler.
+    """
+    
+    def get(self, request):
+        return Response({
+            'success': True,
+            'scheduler': get_scheduler().stats()
+        }, status=status.HTTP_200_OK)
+
+
+class ProcessedImageExportView(APIView):
+    """
+    API endpoint to download a selected set of processed images as a single ZIP.
+    The archive is built on the fly and streamed, so memory use stays constant.
+    """
+    
+    def get(self, request):
+        # Allow plain download links: ?filenames=a.png&filenames=b.png
+        data = {'filenames': request.query_params.getlist('filenames')}
+        if 'archive_name' in request.query_params:
+            data['archive_name'] = request.query_params['archive_name']
+        return self._export(data)
+    
+    def post(self, request):
+        return self._export(request.data)
+    
+    def _export(self, data):
+        serializer = ProcessedImageExportSerializer(data=data)
+        
+        if not serializer.is_valid():
+            return Response(
+                serializer.errors, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        filenames = serializer.validated_data['filenames']
+        archive_name = serializer.validated_data['archive_name']
+        
+        media_path = os.path.join(settings.MEDIA_ROOT, 'processed')
+        file_paths = [os.path.join(media_path, filename) for filename in filenames]
+        
+        missing = [
+            filename for filename, path in zip(filenames, file_paths)
+            if not os.path.isfile(path)
+        ]
+        if missing:
+            return Response({
+                'success': False,
+                'error': 'Some processed images were not found',
+                'missing': missing
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        response = StreamingHttpResponse(
+            iter_zip_stream(file_paths),
+            content_type='application/zip'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{archive_name}.zip"'
+        return response
+
+
+class MediaFileView(View):
+    """
+    Serves files under MEDIA_ROOT. Processed outputs never change once written,
+    so responses carry strong ETags and long-lived Cache-Control headers and
+    support conditional and range requests.
+    
+    Images can be requested as resized derivatives, e.g.
+    /media/processed/<name>?w=256&fmt=webp. Derivatives are generated on first
+    request and cached on disk.
+    """
+    
+    DERIVATIVE_SOURCE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+    
+    def get(self, request, path):
+        try:
+            file_path = safe_join(settings.MEDIA_ROOT, path)
+        except SuspiciousFileOperation:
+            raise Http404('File not found')
+        
+        if not os.path.isfile(file_path):
+            raise Http404('File not found')
+        
+        if 'w' in request.GET or 'fmt' in request.GET:
+            return self._serve_derivative(request, file_path)
+        
+        return serve_file(request, file_path, path)
+    
+    def _serve_derivative(self, request, file_path):
+        if not file_path.lower().endswith(self.DERIVATIVE_SOURCE_EXTENSIONS):
+            return JsonResponse(
+                {'error': 'Resized versions are only available for images'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = MediaDerivativeSerializer(data=request.GET)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        source_etag = file_etag(file_path, os.stat(file_path))
+        derivative_path = get_or_create_derivative(
+            file_path,
+            source_etag,
+            serializer.validated_data.get('w'),
+            serializer.validated_data['fmt']
+        )
+        
+        return serve_file(
+            request,
+            os.path.join(settings.MEDIA_ROOT, derivative_path),
+            derivative_path
+        )